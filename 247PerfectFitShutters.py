@@ -2,25 +2,46 @@ import re
 from playwright.sync_api import Playwright, sync_playwright, expect
 import time
 import csv
+import os
+import sys
+import har_mode
+import browser_server
+import slow_cell_tracer
+import request_filter
+import sweep_planner
 import pandas as pd
 from collections import defaultdict
 
 
+SCRIPT_NAME = os.path.splitext(os.path.basename(__file__))[0]
+
+
 def run(playwright: Playwright) -> None:
     # Use headless for maximum speed
-    browser = playwright.chromium.launch(
+    # Attach to the shared browser server when BROWSER_SERVER is set
+    browser = browser_server.connect(
+        playwright,
         headless=True,  # Changed back to headless for speed
         args=['--disable-web-security', '--disable-dev-shm-usage']
     )
 
     context = browser.new_context()
 
+    # Record or replay the sweep's network traffic when HAR_MODE is set
+    har_mode.setup_har(context, SCRIPT_NAME)
+
     # Block images, CSS, and fonts for faster loading
     context.route("**/*.{png,jpg,jpeg,gif,svg,css,woff,woff2}",
                   lambda route: route.abort())
 
+    # Only let first-party pricing traffic through when REQUEST_FILTER is set
+    allowlist_filter = request_filter.install(context, '247blinds')
+
     page = context.new_page()
 
+    # Save traces for outlier cells when TRACE_SLOW_CELLS is set
+    tracer = slow_cell_tracer.make_tracer(context, page, SCRIPT_NAME)
+
     print("Loading page...")
     page.goto(
         "https://www.247blinds.co.uk/sierra-ice-white-perfect-fit-shutter-blind",
@@ -96,8 +117,6 @@ def run(playwright: Playwright) -> None:
     drop_input = page.locator("#input-custom-Drop")
     price_button = page.get_by_role("button", name="Get Price")
 
-    current_width = None
-
     # Dictionary to store all prices {(width, drop): price}
     price_data = {}
 
@@ -105,70 +124,78 @@ def run(playwright: Playwright) -> None:
     start_time = time.time()
     total_combinations = 0
 
-    # Loop through width values from 30 to 300 in increments of 10
-    for width in range(30, 301, 10):
-        # Only update width if it's different from current
-        if current_width != width:
+    # Widths from 30 to 300 and drops from 30 to 210, in increments of 10,
+    # walked serpentine so each cell only rewrites the field that changes
+    costs = sweep_planner.SITE_COSTS['247blinds']
+    plan = sweep_planner.plan(
+        sweep_planner.grid(range(30, 301, 10), range(30, 211, 10)), costs)
+    print(f"Sweep plan: {sweep_planner.describe(plan, costs)}")
+
+    for width, drop, changed in plan:
+        total_combinations += 1
+        print(f"Processing {width}x{drop}...")
+        tracer.start_cell(f"{width}x{drop}")
+
+        if 'width' in changed:
             print(f"Setting width to {width}...")
             # Make sure element is in view and clickable
             width_input.scroll_into_view_if_needed()
             width_input.click(force=True)  # Force click to bypass overlays
             width_input.press("Control+a")  # Select all
             width_input.fill(str(width))
-            current_width = width
-
-        # Loop through drop values from 30 to 210 in increments of 10
-        for drop in range(30, 211, 10):
-            total_combinations += 1
-            print(f"Processing {width}x{drop}...")
 
+        if 'drop' in changed:
             # Update drop
             drop_input.scroll_into_view_if_needed()
             drop_input.click(force=True)  # Force click
             drop_input.press("Control+a")  # Select all
             drop_input.fill(str(drop))
 
-            # Get price
-            price_button.scroll_into_view_if_needed()
-            price_button.click(force=True)  # Force click
-
-            # Wait for price to appear
-            try:
-                # Wait for level2-area to update with a price
-                page.wait_for_function(
-                    """() => {
-                        const area = document.querySelector('#level2-area');
-                        return area && area.textContent.includes('£');
-                    }""",
-                    timeout=3000
-                )
-
-                # Extract price
-                price_area = page.locator("#level2-area")
-                price_text = price_area.text_content()
-
-                # Find price with regex
-                price_match = re.search(r'£(\d+\.\d+)', price_text)
-                if price_match:
-                    # Extract just the number
-                    price_value = float(price_match.group(1))
-                    price_data[(width, drop)] = price_value
-                    print(f"{width}x{drop}: £{price_value}")
-                else:
-                    print(
-                        f"{width}x{drop}: No price found in: {price_text[:50]}...")
-                    # Store None for missing prices
-                    price_data[(width, drop)] = None
-
-            except:
-                print(f"{width}x{drop}: Timeout waiting for price")
-                price_data[(width, drop)] = None  # Store None for errors
+        # Get price
+        price_button.scroll_into_view_if_needed()
+        price_button.click(force=True)  # Force click
+
+        # Wait for price to appear
+        try:
+            # Wait for level2-area to update with a price
+            page.wait_for_function(
+                """() => {
+                    const area = document.querySelector('#level2-area');
+                    return area && area.textContent.includes('£');
+                }""",
+                timeout=3000
+            )
+
+            # Extract price
+            price_area = page.locator("#level2-area")
+            price_text = price_area.text_content()
+
+            # Find price with regex
+            price_match = re.search(r'£(\d+\.\d+)', price_text)
+            if price_match:
+                # Extract just the number
+                price_value = float(price_match.group(1))
+                price_data[(width, drop)] = price_value
+                print(f"{width}x{drop}: £{price_value}")
+            else:
+                print(
+                    f"{width}x{drop}: No price found in: {price_text[:50]}...")
+                # Store None for missing prices
+                price_data[(width, drop)] = None
+
+        except:
+            print(f"{width}x{drop}: Timeout waiting for price")
+            price_data[(width, drop)] = None  # Store None for errors
+
+        tracer.end_cell()
 
     elapsed_time = time.time() - start_time
     avg_time = elapsed_time / total_combinations if total_combinations > 0 else 0
     print(
         f"\nCompleted {total_combinations} combinations in {elapsed_time:.2f}s")
     print(f"Average time per combination: {avg_time:.3f}s")
+    har_ok = har_mode.finish_har(
+        SCRIPT_NAME, price_data, total_combinations, elapsed_time)
 
     # Create price matrix and save to CSV
     print("\nCreating price matrix...")
@@ -221,9 +248,15 @@ def run(playwright: Playwright) -> None:
         f"Missing prices: {sum(1 for p in price_data.values() if p is None)}")
 
     # ---------------------
+    tracer.close()
+    if allowlist_filter:
+        allowlist_filter.report()
     context.close()
     browser.close()
 
+    if not har_ok:
+        sys.exit(1)
+
 
 with sync_playwright() as playwright:
     run(playwright)
@@ -2,23 +2,44 @@ import re
 from playwright.sync_api import Playwright, sync_playwright, expect
 import time
 import csv
+import os
+import sys
+import har_mode
+import browser_server
+import slow_cell_tracer
+import request_filter
+import sweep_planner
+
+
+SCRIPT_NAME = os.path.splitext(os.path.basename(__file__))[0]
 
 
 def run(playwright: Playwright) -> None:
     # Use headless mode for maximum speed
-    browser = playwright.chromium.launch(
+    # Attach to the shared browser server when BROWSER_SERVER is set
+    browser = browser_server.connect(
+        playwright,
         headless=True,
         args=['--disable-dev-shm-usage']
     )
 
     context = browser.new_context()
 
+    # Record or replay the sweep's network traffic when HAR_MODE is set
+    har_mode.setup_har(context, SCRIPT_NAME)
+
     # Block non-essential resources for speed
     context.route("**/*.{png,jpg,jpeg,gif,svg,woff,woff2}",
                   lambda route: route.abort())
 
+    # Only let first-party pricing traffic through when REQUEST_FILTER is set
+    allowlist_filter = request_filter.install(context, '247blinds')
+
     page = context.new_page()
 
+    # Save traces for outlier cells when TRACE_SLOW_CELLS is set
+    tracer = slow_cell_tracer.make_tracer(context, page, SCRIPT_NAME)
+
     print("Loading page...")
     page.goto(
         "https://www.247blinds.co.uk/andromeda-breeze-white-vertical-blind",
@@ -88,112 +109,80 @@ def run(playwright: Playwright) -> None:
     print("Starting price collection...")
     start_time = time.time()
     total_combinations = 0
-    current_width = None
+
+    # Plan a serpentine walk so each cell only rewrites the field that changes
+    costs = sweep_planner.SITE_COSTS['247blinds']
+    plan = sweep_planner.plan(sweep_planner.grid(widths, drops), costs)
+    print(f"Sweep plan: {sweep_planner.describe(plan, costs)}")
 
     # Loop through all combinations
-    for width in widths:
-        # Only update width when it changes (optimization)
-        if current_width != width:
+    for width, drop, changed in plan:
+        total_combinations += 1
+        print(f"Processing {width}x{drop}...")
+        tracer.start_cell(f"{width}x{drop}")
+
+        if 'width' in changed:
             print(f"Setting width to {width}...")
             width_input.click()
             width_input.press("Control+a")
             width_input.fill(str(width))
-            current_width = width
-
-        for drop in drops:
-            total_combinations += 1
-            print(f"Processing {width}x{drop}...")
 
+        if 'drop' in changed:
             # Enter drop value
             drop_input.click()
             drop_input.press("Control+a")
             drop_input.fill(str(drop))
 
-            # Get price
-            price_button.click()
-
-            # Wait for price to appear with retries
-            max_retries = 3  # Increased from 2 to 3
-            retry_count = 0
-            got_price = False
+        # Get price
+        price_button.click()
+
+        # Wait for price to appear with retries
+        max_retries = 3  # Increased from 2 to 3
+        retry_count = 0
+        got_price = False
+
+        # Use longer timeouts for first few combinations
+        # First few combinations
+        is_early_combination = (width == 41 and drop <= 61)
+        # 5s for early ones, 2s for others
+        timeout = 5000 if is_early_combination else 2000
+        # Longer waits for early combinations
+        wait_time = 1500 if is_early_combination else 500
+
+        while retry_count < max_retries and not got_price:
+            try:
+                # Wait for level2-area to update with a price
+                page.wait_for_function(
+                    """() => {
+                        const area = document.querySelector('#level2-area');
+                        return area && area.textContent.includes('£');
+                    }""",
+                    timeout=timeout  # Use dynamic timeout based on combination
+                )
+
+                # Check for specific price element with class .price
+                price_element = page.locator("#level2-area .price").first
 
-            # Use longer timeouts for first few combinations
-            # First few combinations
-            is_early_combination = (width == 41 and drop <= 61)
-            # 5s for early ones, 2s for others
-            timeout = 5000 if is_early_combination else 2000
-            # Longer waits for early combinations
-            wait_time = 1500 if is_early_combination else 500
-
-            while retry_count < max_retries and not got_price:
                 try:
-                    # Wait for level2-area to update with a price
-                    page.wait_for_function(
-                        """() => {
-                            const area = document.querySelector('#level2-area');
-                            return area && area.textContent.includes('£');
-                        }""",
-                        timeout=timeout  # Use dynamic timeout based on combination
-                    )
-
-                    # Check for specific price element with class .price
-                    price_element = page.locator("#level2-area .price").first
-
-                    try:
-                        # Use the .price element if available
-                        price_text = price_element.text_content().strip()
-                        price_match = re.search(r'£(\d+\.\d+)', price_text)
-                        if price_match:
-                            price_value = float(price_match.group(1))
-                            price_data[(width, drop)] = price_value
-                            print(f"{width}x{drop}: {price_text}")
-                            got_price = True
-                        else:
-                            # If for some reason .price element doesn't contain a price
-                            retry_count += 1
-                            if retry_count < max_retries:
-                                print(
-                                    f"  No price found in .price, retrying... ({retry_count}/{max_retries})")
-                                price_button.click()
-                                # Dynamic wait time
-                                page.wait_for_timeout(wait_time)
-                            else:
-                                # Fallback to the second price element
-                                price_elements = page.locator(
-                                    "text=/£[0-9]+\\.[0-9]+/").all()
-                                if len(price_elements) > 1:
-                                    price_text = price_elements[1].text_content(
-                                    ).strip()
-                                    price_match = re.search(
-                                        r'£(\d+\.\d+)', price_text)
-                                    if price_match:
-                                        price_value = float(
-                                            price_match.group(1))
-                                        price_data[(width, drop)] = price_value
-                                        print(
-                                            f"{width}x{drop}: {price_text} (fallback)")
-                                        got_price = True
-                                    else:
-                                        print(
-                                            f"{width}x{drop}: No price found")
-                                        price_data[(width, drop)] = None
-                                        got_price = True
-                                else:
-                                    print(
-                                        f"{width}x{drop}: No price elements found")
-                                    price_data[(width, drop)] = None
-                                    got_price = True
-                    except Exception as e:
-                        # Fallback to the second price element if .price selector fails
+                    # Use the .price element if available
+                    price_text = price_element.text_content().strip()
+                    price_match = re.search(r'£(\d+\.\d+)', price_text)
+                    if price_match:
+                        price_value = float(price_match.group(1))
+                        price_data[(width, drop)] = price_value
+                        print(f"{width}x{drop}: {price_text}")
+                        got_price = True
+                    else:
+                        # If for some reason .price element doesn't contain a price
                         retry_count += 1
                         if retry_count < max_retries:
                             print(
-                                f"  Error getting price, retrying... ({retry_count}/{max_retries})")
+                                f"  No price found in .price, retrying... ({retry_count}/{max_retries})")
                             price_button.click()
                             # Dynamic wait time
                             page.wait_for_timeout(wait_time)
                         else:
-                            # Last attempt with fallback
+                            # Fallback to the second price element
                             price_elements = page.locator(
                                 "text=/£[0-9]+\\.[0-9]+/").all()
                             if len(price_elements) > 1:
@@ -202,40 +191,79 @@ def run(playwright: Playwright) -> None:
                                 price_match = re.search(
                                     r'£(\d+\.\d+)', price_text)
                                 if price_match:
-                                    price_value = float(price_match.group(1))
+                                    price_value = float(
+                                        price_match.group(1))
                                     price_data[(width, drop)] = price_value
                                     print(
                                         f"{width}x{drop}: {price_text} (fallback)")
                                     got_price = True
                                 else:
                                     print(
-                                        f"{width}x{drop}: No valid price in element")
+                                        f"{width}x{drop}: No price found")
                                     price_data[(width, drop)] = None
                                     got_price = True
                             else:
-                                print(f"{width}x{drop}: Error: {e}")
+                                print(
+                                    f"{width}x{drop}: No price elements found")
                                 price_data[(width, drop)] = None
                                 got_price = True
-
                 except Exception as e:
+                    # Fallback to the second price element if .price selector fails
                     retry_count += 1
                     if retry_count < max_retries:
                         print(
-                            f"  Error waiting for price, retrying... ({retry_count}/{max_retries})")
+                            f"  Error getting price, retrying... ({retry_count}/{max_retries})")
                         price_button.click()
-                        # Even longer wait on error
-                        page.wait_for_timeout(wait_time * 2)
+                        # Dynamic wait time
+                        page.wait_for_timeout(wait_time)
                     else:
-                        print(
-                            f"{width}x{drop}: Failed after {max_retries} attempts: {e}")
-                        price_data[(width, drop)] = None
-                        got_price = True
+                        # Last attempt with fallback
+                        price_elements = page.locator(
+                            "text=/£[0-9]+\\.[0-9]+/").all()
+                        if len(price_elements) > 1:
+                            price_text = price_elements[1].text_content(
+                            ).strip()
+                            price_match = re.search(
+                                r'£(\d+\.\d+)', price_text)
+                            if price_match:
+                                price_value = float(price_match.group(1))
+                                price_data[(width, drop)] = price_value
+                                print(
+                                    f"{width}x{drop}: {price_text} (fallback)")
+                                got_price = True
+                            else:
+                                print(
+                                    f"{width}x{drop}: No valid price in element")
+                                price_data[(width, drop)] = None
+                                got_price = True
+                        else:
+                            print(f"{width}x{drop}: Error: {e}")
+                            price_data[(width, drop)] = None
+                            got_price = True
+
+            except Exception as e:
+                retry_count += 1
+                if retry_count < max_retries:
+                    print(
+                        f"  Error waiting for price, retrying... ({retry_count}/{max_retries})")
+                    price_button.click()
+                    # Even longer wait on error
+                    page.wait_for_timeout(wait_time * 2)
+                else:
+                    print(
+                        f"{width}x{drop}: Failed after {max_retries} attempts: {e}")
+                    price_data[(width, drop)] = None
+                    got_price = True
+
+        tracer.end_cell()
 
     elapsed_time = time.time() - start_time
     avg_time = elapsed_time / total_combinations if total_combinations > 0 else 0
     print(
         f"\nCompleted {total_combinations} combinations in {elapsed_time:.2f}s")
     print(f"Average time per combination: {avg_time:.3f}s")
+    har_ok = har_mode.finish_har(
+        SCRIPT_NAME, price_data, total_combinations, elapsed_time)
 
     # Create price matrix and save to CSV
     print("\nCreating price matrix...")
@@ -288,9 +316,15 @@ def run(playwright: Playwright) -> None:
         f"Missing prices: {sum(1 for p in price_data.values() if p is None)}")
 
     # ---------------------
+    tracer.close()
+    if allowlist_filter:
+        allowlist_filter.report()
     context.close()
     browser.close()
 
+    if not har_ok:
+        sys.exit(1)
+
 
 with sync_playwright() as playwright:
     run(playwright)
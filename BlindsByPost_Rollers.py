@@ -4,8 +4,32 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import time
+import bbp_calculator
+import browser_server
+import sweep_planner
 
-driver = webdriver.Chrome()
+driver = None
+shared_browser = browser_server.debugger_address()
+if shared_browser:
+    # Attach to the shared browser server and work in a tab of our own.
+    # The server runs Playwright's Chromium, so ask Selenium Manager for the
+    # chromedriver matching that rather than the installed Chrome.
+    options = webdriver.ChromeOptions()
+    options.debugger_address = shared_browser
+    version = browser_server.browser_version(browser_server.BROWSER_SERVER)
+    if version:
+        options.browser_version = version
+    try:
+        driver = webdriver.Chrome(options=options)
+        driver.switch_to.new_window('tab')
+    except Exception as e:
+        print(f"Couldn't attach to browser server ({e}), launching locally")
+        if driver:
+            driver.quit()
+        driver = None
+        shared_browser = None
+if driver is None:
+    driver = webdriver.Chrome(options=webdriver.ChromeOptions())
 driver.get(
     "https://www.blindsbypost.co.uk/roller-blinds/tradechoice-brilliant-white-roller-blinds/")
 
@@ -50,30 +74,55 @@ instant_price = WebDriverWait(driver, 10).until(
 instant_price.click()
 time.sleep(1)
 
-# Loop and collect prices
-for drop in drops:
-    row = [drop]  # Start each row with the drop value
-    for width in widths:
+if bbp_calculator.CALC_MODE == 'direct':
+    # Read every price from the page's own calculator in one batch
+    prices = bbp_calculator.extract_prices(
+        bbp_calculator.selenium_evaluator(driver), widths, drops,
+        "250 - 2500 mm", "250 - 3008 mm",
+        price_selector=".cus-discount-price")
+    for drop in drops:
+        matrix.append([drop] + [bbp_calculator.format_price(prices[(width, drop)])
+                                for width in widths])
+else:
+    # Walk the grid serpentine from the size already entered, so each cell
+    # only rewrites (and waits on) the one field that changes
+    costs = sweep_planner.SITE_COSTS['blindsbypost']
+    plan = sweep_planner.plan(sweep_planner.grid(widths, drops), costs,
+                              start=(widths[0], drops[0]))
+    print(f"Sweep plan: {sweep_planner.describe(plan, costs)}")
+
+    # Loop and collect prices
+    prices = {}
+    for width, drop, changed in plan:
         # Update width and drop
-        width_element = driver.find_element(
-            By.CSS_SELECTOR, "input[placeholder='250 - 2500 mm']")
-        width_element.clear()
-        width_element.send_keys(str(width))
-        time.sleep(0.4)
+        if 'width' in changed:
+            width_element = driver.find_element(
+                By.CSS_SELECTOR, "input[placeholder='250 - 2500 mm']")
+            width_element.clear()
+            width_element.send_keys(str(width))
+            if 'drop' in changed:
+                time.sleep(0.4)
+
+        if 'drop' in changed:
+            drop_element = driver.find_element(
+                By.CSS_SELECTOR, "input[placeholder='250 - 3008 mm']")
+            drop_element.clear()
+            drop_element.send_keys(str(drop))
 
-        drop_element = driver.find_element(
-            By.CSS_SELECTOR, "input[placeholder='250 - 3008 mm']")
-        drop_element.clear()
-        drop_element.send_keys(str(drop))
-        time.sleep(0.8)
+        # Give the price the full settle time after the last field written,
+        # whichever it was (the first cell is already showing its price)
+        if changed:
+            time.sleep(0.8)
 
         price_elem = driver.find_element(
             By.CSS_SELECTOR, ".cus-discount-price")
         price_text = price_elem.text.strip()
-        row.append(price_text)
+        prices[(width, drop)] = price_text
         print(f"Width: {width}, Drop: {drop} => Price: {price_text}")
 
-    matrix.append(row)
+    for drop in drops:
+        # Start each row with the drop value
+        matrix.append([drop] + [prices[(width, drop)] for width in widths])
 
 # Write to CSV
 with open("price_matrix.csv", "w", newline="") as f:
@@ -81,4 +130,7 @@ with open("price_matrix.csv", "w", newline="") as f:
     writer.writerows(matrix)
 
 print("Saved all results to price_matrix.csv")
+if shared_browser:
+    # Close our tab but leave the shared browser running
+    driver.close()
 driver.quit()
@@ -2,11 +2,24 @@ import re
 from playwright.sync_api import Playwright, sync_playwright, expect
 import time
 import csv
+import os
+import sys
+import har_mode
+import browser_server
+import slow_cell_tracer
+import request_filter
+import sweep_planner
+import bbp_calculator
+
+
+SCRIPT_NAME = os.path.splitext(os.path.basename(__file__))[0]
 
 
 def run(playwright: Playwright) -> None:
     # Try to make it go faster by adding headless mode and optimizing waits
-    browser = playwright.chromium.launch(
+    # Attach to the shared browser server when BROWSER_SERVER is set
+    browser = browser_server.connect(
+        playwright,
         headless=True,  # Faster in headless mode
         args=['--disable-dev-shm-usage', '--start-maximized']
     )
@@ -18,8 +31,17 @@ def run(playwright: Playwright) -> None:
     context = browser.new_context(
         viewport={"width": 1920, "height": 1080}  # Set a large viewport
     )
+
+    # Record or replay the sweep's network traffic when HAR_MODE is set
+    har_mode.setup_har(context, SCRIPT_NAME)
+
+    # Only let first-party pricing traffic through when REQUEST_FILTER is set
+    allowlist_filter = request_filter.install(context, 'blindsbypost')
     page = context.new_page()
 
+    # Save traces for outlier cells when TRACE_SLOW_CELLS is set
+    tracer = slow_cell_tracer.make_tracer(context, page, SCRIPT_NAME)
+
     print("Loading page...")
     page.goto("https://www.blindsbypost.co.uk/perfect-fit-blinds/perfect-fit-shutters/cotton-white-perfect-fit-shutter/")
 
@@ -97,93 +119,92 @@ def run(playwright: Playwright) -> None:
             print(f"  Error getting price: {e}")
             return None
 
-    # Get the price for the first combination
-    first_price = get_main_price()
-    if first_price is not None:
-        price_data[(first_width, first_drop)] = first_price
-        print(f"{first_width}x{first_drop}: £{first_price}")
-        total_combinations += 1
+    if bbp_calculator.CALC_MODE == 'direct':
+        # Read every price from the page's own calculator in one batch
+        price_data = bbp_calculator.extract_prices(
+            bbp_calculator.playwright_evaluator(page), widths, drops,
+            "- 1800 mm", "- 2400 mm", price_index=main_price_index)
+        total_combinations = len(price_data)
     else:
-        print(f"{first_width}x{first_drop}: No price found")
-
-    # Optimized function to update dimensions and get price
-    def get_price_for_dimensions(width, drop):
-        # Update width using keyboard shortcut for efficiency
-        width_field = page.get_by_placeholder("- 1800 mm")
-        width_field.click()
-        page.keyboard.press("Control+a")
-        width_field.fill(str(width))
-
-        # Update drop using keyboard shortcut for efficiency
-        drop_field = page.get_by_placeholder("- 2400 mm")
-        drop_field.click()
-        page.keyboard.press("Control+a")
-        drop_field.fill(str(drop))
-
-        # Press Tab to ensure the field loses focus and triggers the update
-        page.keyboard.press("Tab")
-
-        # Use a shorter wait time and check for price
-        page.wait_for_timeout(400)  # Wait for price to update
-
-        # Make sure we're scrolled to see the price
-        page.evaluate("window.scrollBy(0, 350)")
-
-        price_value = get_main_price()
-        if price_value is not None:
-            return price_value
-
-        # If price not found, try again with a small delay
-        page.wait_for_timeout(600)
-        return get_main_price()
-
-    # Loop through all widths first to minimize width changes
-    current_width = first_width
-    for width in widths:
-        # Skip the first width as we've already processed its first drop
-        if width == first_width:
-            # For the first width, process remaining drops
-            for drop in drops:
-                # Skip the first drop as it's already processed
-                if drop == first_drop:
-                    continue
-
-                total_combinations += 1
-                print(f"Processing {width}x{drop}...")
-
-                price_value = get_price_for_dimensions(width, drop)
-
-                if price_value is not None:
-                    price_data[(width, drop)] = price_value
-                    print(f"{width}x{drop}: £{price_value}")
-                else:
-                    print(f"{width}x{drop}: No price found")
-                    price_data[(width, drop)] = None
+        # Get the price for the first combination
+        first_price = get_main_price()
+        if first_price is not None:
+            price_data[(first_width, first_drop)] = first_price
+            print(f"{first_width}x{first_drop}: £{first_price}")
+            total_combinations += 1
         else:
-            # For all other widths, process all drops
-            for drop in drops:
-                # Check if we're approaching the time limit
-                if time.time() > end_time:
-                    print("Reached maximum runtime, saving results so far...")
-                    break
+            print(f"{first_width}x{first_drop}: No price found")
+
+        # Optimized function to update dimensions and get price
+        def get_price_for_dimensions(width, drop, changed=('width', 'drop')):
+            # Only rewrite the fields the sweep plan says have changed
+            if 'width' in changed:
+                # Update width using keyboard shortcut for efficiency
+                width_field = page.get_by_placeholder("- 1800 mm")
+                width_field.click()
+                page.keyboard.press("Control+a")
+                width_field.fill(str(width))
+
+            if 'drop' in changed:
+                # Update drop using keyboard shortcut for efficiency
+                drop_field = page.get_by_placeholder("- 2400 mm")
+                drop_field.click()
+                page.keyboard.press("Control+a")
+                drop_field.fill(str(drop))
+
+            # Press Tab to ensure the field loses focus and triggers the update
+            page.keyboard.press("Tab")
+
+            # Use a shorter wait time and check for price
+            page.wait_for_timeout(400)  # Wait for price to update
 
-                total_combinations += 1
-                print(f"Processing {width}x{drop}...")
-
-                price_value = get_price_for_dimensions(width, drop)
+            # Make sure we're scrolled to see the price
+            page.evaluate("window.scrollBy(0, 350)")
 
-                if price_value is not None:
-                    price_data[(width, drop)] = price_value
-                    print(f"{width}x{drop}: £{price_value}")
-                else:
-                    print(f"{width}x{drop}: No price found")
-                    price_data[(width, drop)] = None
+            price_value = get_main_price()
+            if price_value is not None:
+                return price_value
+
+            # If price not found, try again with a small delay
+            page.wait_for_timeout(600)
+            return get_main_price()
+
+        # Walk the remaining cells serpentine from the first one, so each
+        # step only changes one field
+        costs = sweep_planner.SITE_COSTS['blindsbypost']
+        remaining = [cell for cell in sweep_planner.grid(widths, drops)
+                     if cell != (first_width, first_drop)]
+        plan = sweep_planner.plan(remaining, costs,
+                                  start=(first_width, first_drop))
+        print(f"Sweep plan: {sweep_planner.describe(plan, costs)}")
+
+        for width, drop, changed in plan:
+            # Check if we're approaching the time limit
+            if time.time() > end_time:
+                print("Reached maximum runtime, saving results so far...")
+                break
+
+            total_combinations += 1
+            print(f"Processing {width}x{drop}...")
+
+            tracer.start_cell(f"{width}x{drop}")
+            price_value = get_price_for_dimensions(width, drop, changed)
+            tracer.end_cell()
+
+            if price_value is not None:
+                price_data[(width, drop)] = price_value
+                print(f"{width}x{drop}: £{price_value}")
+            else:
+                print(f"{width}x{drop}: No price found")
+                price_data[(width, drop)] = None
 
     elapsed_time = time.time() - start_time
     avg_time = elapsed_time / total_combinations if total_combinations > 0 else 0
     print(
         f"\nCompleted {total_combinations} combinations in {elapsed_time:.2f}s")
     print(f"Average time per combination: {avg_time:.3f}s")
+    har_ok = har_mode.finish_har(
+        SCRIPT_NAME, price_data, total_combinations, elapsed_time)
 
     # Create price matrix and save to CSV
     print("\nCreating price matrix...")
@@ -236,9 +257,15 @@ def run(playwright: Playwright) -> None:
         f"Missing prices: {sum(1 for p in price_data.values() if p is None)}")
 
     # ---------------------
+    tracer.close()
+    if allowlist_filter:
+        allowlist_filter.report()
     context.close()
     browser.close()
 
+    if not har_ok:
+        sys.exit(1)
+
 
 with sync_playwright() as playwright:
     run(playwright)
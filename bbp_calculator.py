@@ -0,0 +1,262 @@
+import os
+import time
+
+
+# CALC_MODE=direct makes the Blinds By Post scripts read the whole matrix
+# from the page's own price calculator instead of driving the form per cell
+CALC_MODE = os.environ.get('CALC_MODE', '').lower()
+
+# Runs inside the page. 'discover' looks for a width x drop price table in
+# the extra-product-options data (element data attributes and globals such
+# as the lookup tables the options plugin ships to the browser). 'batch'
+# drives the options form from page JavaScript for many sizes in one call,
+# which skips the per-cell round trips to Python.
+CALCULATOR_JS = r"""
+async (config) => {
+    const isNumeric = (k) => /^\s*\d+(\.\d+)?\s*$/.test(String(k));
+    const toNumber = (v) => typeof v === 'number' ? v : parseFloat(String(v).replace(/[£,]/g, ''));
+    const SKIP_TAGS = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE']);
+
+    // {rowKey: {colKey: price}} with numeric keys and prices on both levels
+    const asTable = (obj) => {
+        if (!obj || typeof obj !== 'object') return null;
+        const rowKeys = Object.keys(obj).filter(isNumeric);
+        if (rowKeys.length < 3) return null;
+        const rows = {};
+        for (const rk of rowKeys) {
+            const row = obj[rk];
+            if (!row || typeof row !== 'object') return null;
+            const colKeys = Object.keys(row).filter(isNumeric);
+            if (colKeys.length < 3) return null;
+            rows[rk] = {};
+            for (const ck of colKeys) {
+                const price = toNumber(row[ck]);
+                if (Number.isNaN(price)) return null;
+                rows[rk][ck] = price;
+            }
+        }
+        return rows;
+    };
+
+    const findTables = (root, path, depth, seen, found) => {
+        if (!root || typeof root !== 'object' || depth > 5 || seen.has(root)) return;
+        seen.add(root);
+        const table = asTable(root);
+        if (table) {
+            found.push({path, rows: table});
+            return;
+        }
+        let keys;
+        try { keys = Object.keys(root); } catch (e) { return; }
+        for (const key of keys.slice(0, 500)) {
+            let value;
+            try { value = root[key]; } catch (e) { continue; }
+            if (typeof value === 'string' && /^[\[{]/.test(value.trim())) {
+                try { value = JSON.parse(value); } catch (e) { continue; }
+            }
+            findTables(value, path + '.' + key, depth + 1, seen, found);
+        }
+    };
+
+    const readPrice = () => {
+        if (config.priceSelector) {
+            const el = document.querySelector(config.priceSelector);
+            const m = el && el.textContent.match(/£\s*([\d,]+\.\d+)/);
+            return m ? toNumber(m[1]) : null;
+        }
+        // Same as the scripts' text=/£.../ locator: innermost elements whose
+        // text holds a price, in document order, taking the configured index.
+        // Element text rather than text nodes, because WooCommerce prints
+        // the '£' in its own span; script and style text is skipped the way
+        // Playwright's text engine skips it.
+        const amounts = [];
+        const visit = (el) => {
+            let text = '';
+            let inner = false;
+            for (const node of el.childNodes) {
+                if (node.nodeType === Node.TEXT_NODE) {
+                    text += node.textContent;
+                } else if (node.nodeType === Node.ELEMENT_NODE && !SKIP_TAGS.has(node.tagName)) {
+                    const [childText, childMatched] = visit(node);
+                    text += childText;
+                    inner = inner || childMatched;
+                }
+            }
+            const m = text.replace(/\s+/g, ' ').match(/£\s*([\d,]+\.\d+)/);
+            if (m && !inner) amounts.push(toNumber(m[1]));
+            return [text, inner || Boolean(m)];
+        };
+        visit(document.body);
+        return amounts.length > config.priceIndex ? amounts[config.priceIndex] : null;
+    };
+
+    const setValue = (el, value) => {
+        const setter = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+        setter.call(el, String(value));
+        for (const type of ['input', 'keyup', 'change']) {
+            el.dispatchEvent(new Event(type, {bubbles: true}));
+        }
+        if (window.jQuery) window.jQuery(el).trigger('change');
+    };
+
+    const nextFrame = () => new Promise((resolve) => requestAnimationFrame(() => resolve()));
+
+    if (config.action === 'discover') {
+        const found = [];
+        const seen = new Set();
+        for (const el of document.querySelectorAll('.tc-container [data-rules], .tc-container [data-lookuptable], [data-lookuptable]')) {
+            for (const attr of el.getAttributeNames().filter((a) => a.startsWith('data-'))) {
+                findTables({[attr]: el.getAttribute(attr)}, 'element', 0, seen, found);
+            }
+        }
+        for (const key of Object.keys(window)) {
+            if (!/tm|epo|tc|price|lookup|calc/i.test(key)) continue;
+            let value;
+            try { value = window[key]; } catch (e) { continue; }
+            findTables(value, 'window.' + key, 0, seen, found);
+        }
+        // Biggest table wins; small ones are usually quantity discounts
+        found.sort((a, b) => Object.keys(b.rows).length - Object.keys(a.rows).length);
+        return found.length ? found[0] : null;
+    }
+
+    const widthInput = document.querySelector(config.widthSelector);
+    const dropInput = document.querySelector(config.dropSelector);
+    if (!widthInput || !dropInput) {
+        throw new Error(`Size inputs not found: ${config.widthSelector}, ${config.dropSelector}`);
+    }
+    const prices = [];
+    let lastWidth = null;
+    for (const [width, drop] of config.sizes) {
+        const before = readPrice();
+        if (width !== lastWidth) {
+            setValue(widthInput, width);
+            lastWidth = width;
+        }
+        setValue(dropInput, drop);
+        // Wait for the widget to redraw; neighbouring sizes in the same
+        // band keep the same price, so give up waiting after settleMs
+        const deadline = performance.now() + config.settleMs;
+        let price = readPrice();
+        while (price === before && performance.now() < deadline) {
+            await nextFrame();
+            price = readPrice();
+        }
+        prices.push(price);
+    }
+    return prices;
+}
+"""
+
+
+def playwright_evaluator(page):
+    return lambda config: page.evaluate(CALCULATOR_JS, config)
+
+
+def selenium_evaluator(driver, script_timeout=600):
+    driver.set_script_timeout(script_timeout)
+    script = (
+        "const done = arguments[arguments.length - 1];"
+        f"({CALCULATOR_JS})(arguments[0]).then(done, (e) => done({{error: String(e)}}));"
+    )
+    return lambda config: driver.execute_async_script(script, config)
+
+
+def lookup(keys, value):
+    # The options plugin prices a size at the first table key >= the size
+    for key in keys:
+        if key >= value:
+            return key
+    return None
+
+
+def table_price(rows, row_value, col_value):
+    row_key = lookup(sorted(rows), row_value)
+    if row_key is None:
+        return None
+    col_key = lookup(sorted(rows[row_key]), col_value)
+    return rows[row_key][col_key] if col_key is not None else None
+
+
+def placeholder_selector(placeholder):
+    # Substring match, like get_by_placeholder: the shutter form's real
+    # placeholder is the full range ('201 - 1800 mm') but callers may only
+    # know the end of it
+    return f"input[placeholder*='{placeholder}']"
+
+
+def run_batch(evaluate, config, sizes):
+    # Selenium reports a rejected promise as {error: ...} rather than raising
+    result = evaluate(dict(config, action='batch', sizes=sizes))
+    if isinstance(result, dict) and 'error' in result:
+        raise RuntimeError(f"In-page calculator failed: {result['error']}")
+    return result
+
+
+def extract_prices(evaluate, widths, drops, width_placeholder, drop_placeholder,
+                   price_selector=None, price_index=3, settle_ms=500):
+    # Return {(width, drop): price} for every size, reading the price table
+    # straight out of the page when there is one, otherwise driving the
+    # form from page JavaScript in one batch
+    start_time = time.time()
+    config = {
+        'widthSelector': placeholder_selector(width_placeholder),
+        'dropSelector': placeholder_selector(drop_placeholder),
+        'priceSelector': price_selector,
+        'priceIndex': price_index,
+        'settleMs': settle_ms,
+    }
+    sizes = [(w, d) for w in widths for d in drops]
+
+    print("Looking for the page's price table...")
+    table = evaluate(dict(config, action='discover'))
+    if table and 'rows' in table:
+        print(f"Found candidate table at {table['path']} "
+              f"({len(table['rows'])} rows)")
+        rows = {float(rk): {float(ck): v for ck, v in row.items()}
+                for rk, row in table['rows'].items()}
+
+        # Check the table against the live widget at a few sizes, trying
+        # both orientations and allowing a fixed base price on top
+        probes = [sizes[0], sizes[len(sizes) // 2], sizes[-1]]
+        live = run_batch(evaluate, config, probes)
+        for orientation in ('width-rows', 'drop-rows'):
+            def from_table(width, drop):
+                if orientation == 'width-rows':
+                    return table_price(rows, width, drop)
+                return table_price(rows, drop, width)
+
+            offsets = set()
+            for (width, drop), live_price in zip(probes, live):
+                table_value = from_table(width, drop)
+                if table_value is None or live_price is None:
+                    offsets = None
+                    break
+                offsets.add(round(live_price - table_value, 2))
+            if offsets and len(offsets) == 1:
+                offset = offsets.pop()
+                prices = {}
+                for width, drop in sizes:
+                    value = from_table(width, drop)
+                    prices[(width, drop)] = round(value + offset, 2) if value is not None else None
+                print(f"Table matches widget ({orientation}, base £{offset:.2f}); "
+                      f"{len(prices)} prices in {time.time() - start_time:.2f}s")
+                return prices
+        print("Table doesn't match the widget, falling back to batch mode")
+    else:
+        print("No price table found, driving the calculator in-page")
+
+    prices = dict(zip(sizes, run_batch(evaluate, config, sizes)))
+    if all(price is None for price in prices.values()):
+        # Nothing read at all means the price selector or index is wrong,
+        # not that every size is unavailable
+        raise RuntimeError("In-page calculator read no prices; "
+                           "check the price selector or price index")
+    print(f"In-page batch: {len(prices)} prices in {time.time() - start_time:.2f}s")
+    return prices
+
+
+def format_price(price):
+    # Rollers' matrix stores widget text, so keep the same '£12.34' shape
+    return f'£{price:.2f}' if price is not None else 'N/A'
+
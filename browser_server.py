@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+import urllib.request
+
+
+# BROWSER_SERVER=http://127.0.0.1:9222 makes the scrapers attach to a
+# running browser server (python browser_server.py) and open a fresh
+# context there, instead of launching their own Chromium each run
+BROWSER_SERVER = os.environ.get('BROWSER_SERVER')
+DEFAULT_PORT = 9222
+
+# Flags the server starts Chromium with, besides its port and profile. A
+# script asking for anything else (e.g. --disable-web-security) launches
+# its own browser, since a shared one can't take per-client flags.
+SERVER_FLAGS = ['--disable-dev-shm-usage', '--no-first-run',
+                '--no-default-browser-check']
+# Window flags that make no difference to a context with its own viewport
+COSMETIC_FLAGS = ['--start-maximized']
+
+
+def healthy(endpoint, timeout=2):
+    # Chromium answers /json/version on its debugging port while it's up
+    try:
+        with urllib.request.urlopen(f"{endpoint}/json/version", timeout=timeout) as response:
+            return 'webSocketDebuggerUrl' in json.load(response)
+    except Exception:
+        return False
+
+
+def browser_version(endpoint):
+    # Major version of the server's browser ('HeadlessChrome/120.0...' -> '120')
+    try:
+        with urllib.request.urlopen(f"{endpoint}/json/version", timeout=2) as response:
+            browser = json.load(response).get('Browser', '')
+    except Exception:
+        return None
+    match = re.search(r'/(\d+)\.', browser)
+    return match.group(1) if match else None
+
+
+def connect(playwright, **launch_kwargs):
+    # Attach to the shared browser when it's healthy and runs with the
+    # flags the script needs, otherwise launch one as the scripts always have
+    if BROWSER_SERVER:
+        missing = [flag for flag in launch_kwargs.get('args', [])
+                   if flag not in SERVER_FLAGS + COSMETIC_FLAGS]
+        if missing:
+            print(f"Browser server doesn't run with {' '.join(missing)}, launching locally")
+        elif healthy(BROWSER_SERVER):
+            print(f"Connecting to browser server at {BROWSER_SERVER}")
+            return playwright.chromium.connect_over_cdp(BROWSER_SERVER)
+        else:
+            print(f"Browser server at {BROWSER_SERVER} not responding, launching locally")
+    return playwright.chromium.launch(**launch_kwargs)
+
+
+def debugger_address():
+    # host:port for Selenium's ChromeOptions.debugger_address, or None
+    if BROWSER_SERVER and healthy(BROWSER_SERVER):
+        return BROWSER_SERVER.split('://', 1)[-1].rstrip('/')
+    if BROWSER_SERVER:
+        print(f"Browser server at {BROWSER_SERVER} not responding, launching locally")
+    return None
+
+
+def launch(executable, port, user_data_dir, headless=True):
+    args = [
+        executable,
+        f'--remote-debugging-port={port}',
+        f'--user-data-dir={user_data_dir}',
+        *SERVER_FLAGS,
+        'about:blank',
+    ]
+    if headless:
+        args.insert(1, '--headless=new')
+    return subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop(process):
+    if process and process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def serve(port=DEFAULT_PORT, headless=True, check_interval=10, max_age=None,
+          failures_before_restart=3):
+    # Keep one Chromium running with its debugging port open. It is
+    # restarted if the process exits, stops answering health checks, or
+    # (optionally) after max_age seconds to shed leaked memory.
+    from playwright.sync_api import sync_playwright
+    with sync_playwright() as playwright:
+        executable = playwright.chromium.executable_path
+    endpoint = f"http://127.0.0.1:{port}"
+    user_data_dir = tempfile.mkdtemp(prefix='browser-server-')
+    process = None
+    started = 0
+    failures = 0
+
+    print(f"Browser server using {executable}")
+    try:
+        while True:
+            reason = None
+            if process is None:
+                reason = "starting"
+            elif process.poll() is not None:
+                reason = f"exited with code {process.returncode}"
+            elif max_age and time.time() - started > max_age:
+                reason = "max age reached"
+            elif not healthy(endpoint):
+                failures += 1
+                if failures >= failures_before_restart:
+                    reason = f"failed {failures} health checks"
+            else:
+                failures = 0
+
+            if reason:
+                if process is not None:
+                    print(f"Restarting browser: {reason}")
+                    stop(process)
+                process = launch(executable, port, user_data_dir, headless)
+                started = time.time()
+                failures = 0
+                for _ in range(30):
+                    if healthy(endpoint):
+                        break
+                    time.sleep(0.5)
+                print(f"Browser server ready at {endpoint} (pid {process.pid})")
+
+            time.sleep(check_interval)
+    except KeyboardInterrupt:
+        print("\nShutting down browser server...")
+    finally:
+        stop(process)
+        shutil.rmtree(user_data_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run one long-lived Chromium for the scrapers to attach to")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--headed', action='store_true')
+    parser.add_argument('--check-interval', type=float, default=10,
+                        help="Seconds between health checks")
+    parser.add_argument('--max-age', type=float,
+                        help="Restart the browser after this many seconds")
+    args = parser.parse_args()
+
+    print(f"Scrapers attach with: BROWSER_SERVER=http://127.0.0.1:{args.port}")
+    serve(args.port, headless=not args.headed,
+          check_interval=args.check_interval, max_age=args.max_age)
+
+
+if __name__ == '__main__':
+    main()
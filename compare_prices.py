@@ -0,0 +1,261 @@
+import argparse
+import csv
+import itertools
+import os
+import re
+import time
+
+import numpy as np
+
+
+# Unit of the numbers in each matrix label, e.g. '41cm' or '201mm'.
+# Rollers' price_matrix.csv has bare numbers which are always millimetres.
+UNIT_TO_MM = {'mm': 1, 'cm': 10}
+
+# Prefixes of the CSVs the scrapers write, mapped to the retailer name
+RETAILER_PREFIXES = {
+    'florenza_roller_blind_prices': '247blinds',
+    'blinds_price_matrix': '247blinds',
+    'blindsbypost_perfect_fit_prices': 'blindsbypost',
+    'price_matrix': 'blindsbypost',
+}
+
+LABEL_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*(mm|cm)?\s*$', re.I)
+PRICE_PATTERN = re.compile(r'£\s*(\d[\d,]*(?:\.\d+)?)')
+BARE_NUMBER_PATTERN = re.compile(r'^\s*(\d[\d,]*(?:\.\d+)?)\s*$')
+
+
+def parse_size_label(label, default_unit='mm'):
+    # '41cm' -> 410.0, '201mm' -> 201.0, '250' -> 250.0 (default unit)
+    match = LABEL_PATTERN.match(str(label))
+    if not match:
+        raise ValueError(f"Unrecognised size label: {label!r}")
+    unit = (match.group(2) or default_unit).lower()
+    return float(match.group(1)) * UNIT_TO_MM[unit]
+
+
+def parse_price(text):
+    # '£12.34' -> 12.34, 'N/A' or '' -> nan.  The rollers script stores the
+    # raw widget text, which can carry extra words around the amount.
+    match = PRICE_PATTERN.search(str(text)) or BARE_NUMBER_PATTERN.match(str(text))
+    if not match:
+        return np.nan
+    return float(match.group(1).replace(',', ''))
+
+
+def guess_retailer(path):
+    name = os.path.basename(path)
+    for prefix, retailer in RETAILER_PREFIXES.items():
+        if name.startswith(prefix):
+            return retailer
+    return 'unknown'
+
+
+def load_matrix(path, default_unit='mm'):
+    # Read a 'Drop/Width' matrix CSV into (widths_mm, drops_mm, prices)
+    # where prices has shape (len(drops), len(widths)) and NaN for gaps.
+    with open(path, newline='', encoding='utf-8') as csvfile:
+        rows = [row for row in csv.reader(csvfile) if row]
+
+    header = rows[0]
+    widths = np.array([parse_size_label(w, default_unit) for w in header[1:]])
+    drops = np.array([parse_size_label(row[0], default_unit)
+                     for row in rows[1:]])
+    prices = np.array([[parse_price(cell) for cell in row[1:len(header)]]
+                       for row in rows[1:]], dtype=float)
+
+    # Keep both axes ascending so searchsorted works on them
+    width_order = np.argsort(widths)
+    drop_order = np.argsort(drops)
+    return widths[width_order], drops[drop_order], prices[np.ix_(drop_order, width_order)]
+
+
+def band_indices(grid, targets, band):
+    # Map each target size onto the grid point whose band covers it.
+    #   'floor': a sampled size prices everything up to the next sample
+    #            (247 samples 41, 51, ... i.e. just inside each 10cm band)
+    #   'ceil':  a size is charged at the next sampled size up
+    # Targets outside the sampled range get -1.
+    if band == 'floor':
+        idx = np.searchsorted(grid, targets, side='right') - 1
+    elif band == 'ceil':
+        idx = np.searchsorted(grid, targets, side='left')
+    else:
+        raise ValueError(f"Unknown band semantics: {band!r}")
+    outside = (targets < grid[0]) | (targets > grid[-1])
+    idx = np.clip(idx, 0, len(grid) - 1)
+    idx[outside] = -1
+    return idx
+
+
+def resample(widths, drops, prices, lattice_widths, lattice_drops, band='floor'):
+    # Resample one matrix onto the lattice in a single fancy-index gather
+    w_idx = band_indices(widths, lattice_widths, band)
+    d_idx = band_indices(drops, lattice_drops, band)
+    out = prices[np.ix_(np.maximum(d_idx, 0), np.maximum(w_idx, 0))]
+    out[d_idx < 0, :] = np.nan
+    out[:, w_idx < 0] = np.nan
+    return out
+
+
+def build_lattice(matrices, step_mm, span='intersection'):
+    # Common width/drop lattice in mm across all loaded matrices
+    w_lo = [m['widths'][0] for m in matrices]
+    w_hi = [m['widths'][-1] for m in matrices]
+    d_lo = [m['drops'][0] for m in matrices]
+    d_hi = [m['drops'][-1] for m in matrices]
+    if span == 'intersection':
+        w_range, d_range = (max(w_lo), min(w_hi)), (max(d_lo), min(d_hi))
+    else:
+        w_range, d_range = (min(w_lo), max(w_hi)), (min(d_lo), max(d_hi))
+    if w_range[0] > w_range[1] or d_range[0] > d_range[1]:
+        raise ValueError("Matrices have no overlapping sizes; try --span union")
+    lattice_widths = np.arange(w_range[0], w_range[1] + step_mm / 2, step_mm)
+    lattice_drops = np.arange(d_range[0], d_range[1] + step_mm / 2, step_mm)
+    return lattice_widths, lattice_drops
+
+
+def write_gap_csv(path, lattice_widths, lattice_drops, gap):
+    with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Drop/Width'] + [f'{w:g}mm' for w in lattice_widths])
+        for drop, row in zip(lattice_drops, gap):
+            writer.writerow([f'{drop:g}mm'] + [
+                'N/A' if np.isnan(v) else f'{v:.2f}' for v in row])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare retailer price matrices on a common mm lattice")
+    parser.add_argument('csv_files', nargs='+',
+                        help="Matrix CSVs written by the scraper scripts")
+    parser.add_argument('--step', type=float, default=10,
+                        help="Lattice step in mm (default 10)")
+    parser.add_argument('--span', choices=['intersection', 'union'],
+                        default='intersection',
+                        help="Lattice covers sizes every product sells, or any")
+    parser.add_argument('--band', choices=['floor', 'ceil'], default='floor',
+                        help="How a sampled size maps onto the sizes around it")
+    parser.add_argument('--all-pairs', action='store_true',
+                        help="Also compare products from the same retailer")
+    parser.add_argument('--csv-dir',
+                        help="Also write one gap matrix CSV per pair here")
+    parser.add_argument('--save-gaps', action='store_true',
+                        help="Store every gap matrix in the .npz as well")
+    parser.add_argument('--chunk', type=int, default=256,
+                        help="Pairs compared per vectorised batch")
+    parser.add_argument('--out', default=f'price_gaps_{int(time.time())}',
+                        help="Output file prefix")
+    args = parser.parse_args()
+
+    print("Loading matrices...")
+    matrices = []
+    for path in args.csv_files:
+        widths, drops, prices = load_matrix(path)
+        matrices.append({
+            'name': os.path.splitext(os.path.basename(path))[0],
+            'retailer': guess_retailer(path),
+            'widths': widths,
+            'drops': drops,
+            'prices': prices,
+        })
+        print(f"  {path}: {len(widths)}x{len(drops)} "
+              f"({widths[0]:g}-{widths[-1]:g}mm x {drops[0]:g}-{drops[-1]:g}mm)")
+
+    start_time = time.time()
+    lattice_widths, lattice_drops = build_lattice(
+        matrices, args.step, args.span)
+    print(f"Lattice: {len(lattice_widths)} widths x {len(lattice_drops)} drops")
+
+    # Stack every product into one (products, drops, widths) array
+    stack = np.stack([
+        resample(m['widths'], m['drops'], m['prices'],
+                 lattice_widths, lattice_drops, args.band)
+        for m in matrices
+    ])
+
+    pairs = [(i, j) for i, j in itertools.combinations(range(len(matrices)), 2)
+             if args.all_pairs
+             or matrices[i]['retailer'] != matrices[j]['retailer']]
+    if not pairs:
+        print("No product pairs to compare (use --all-pairs for same retailer)")
+        return
+
+    pair_names = [f"{matrices[i]['name']}__vs__{matrices[j]['name']}"
+                  for i, j in pairs]
+    if args.csv_dir:
+        os.makedirs(args.csv_dir, exist_ok=True)
+
+    # Gather + subtract a chunk of pairs at a time so hundreds of products
+    # don't need every gap matrix in memory at once
+    left = np.array([i for i, j in pairs])
+    right = np.array([j for i, j in pairs])
+    counts = np.zeros(len(pairs), dtype=int)
+    means = np.full(len(pairs), np.nan)
+    mins = np.full(len(pairs), np.nan)
+    maxs = np.full(len(pairs), np.nan)
+    saved_gaps = []
+    for chunk_start in range(0, len(pairs), args.chunk):
+        chunk = slice(chunk_start, chunk_start + args.chunk)
+        gaps = stack[left[chunk]] - stack[right[chunk]]
+        valid = ~np.isnan(gaps)
+        chunk_counts = valid.sum(axis=(1, 2))
+        has_cells = chunk_counts > 0
+        counts[chunk] = chunk_counts
+        means[chunk] = np.where(
+            has_cells,
+            np.where(valid, gaps, 0.0).sum(axis=(1, 2)) /
+            np.maximum(chunk_counts, 1),
+            np.nan)
+        mins[chunk] = np.where(
+            has_cells, np.where(valid, gaps, np.inf).min(axis=(1, 2)), np.nan)
+        maxs[chunk] = np.where(
+            has_cells, np.where(valid, gaps, -np.inf).max(axis=(1, 2)), np.nan)
+
+        if args.save_gaps:
+            saved_gaps.append(gaps)
+        if args.csv_dir:
+            for name, gap in zip(pair_names[chunk], gaps):
+                write_gap_csv(os.path.join(args.csv_dir, f'{name}.csv'),
+                              lattice_widths, lattice_drops, gap)
+
+    elapsed_time = time.time() - start_time
+    print(f"Compared {len(pairs)} pairs in {elapsed_time:.3f}s")
+
+    # Gap matrices can be rebuilt from prices[left] - prices[right], so
+    # only store them outright when asked to
+    arrays = {
+        'widths_mm': lattice_widths,
+        'drops_mm': lattice_drops,
+        'products': np.array([m['name'] for m in matrices]),
+        'prices': stack,
+        'pairs': np.array(pair_names),
+        'left': left,
+        'right': right,
+    }
+    if args.save_gaps:
+        arrays['gaps'] = np.concatenate(saved_gaps)
+    np.savez_compressed(f'{args.out}.npz', **arrays)
+    print(f"Resampled prices saved to: {args.out}.npz")
+
+    summary_filename = f'{args.out}_summary.csv'
+    with open(summary_filename, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Product A', 'Product B', 'Cells compared',
+                         'Mean gap (£)', 'Min gap (£)', 'Max gap (£)'])
+        for k, (i, j) in enumerate(pairs):
+            if counts[k] == 0:
+                writer.writerow([matrices[i]['name'], matrices[j]['name'],
+                                 0, 'N/A', 'N/A', 'N/A'])
+                continue
+            writer.writerow([matrices[i]['name'], matrices[j]['name'],
+                             int(counts[k]), f'{means[k]:.2f}',
+                             f'{mins[k]:.2f}', f'{maxs[k]:.2f}'])
+    print(f"Summary saved to: {summary_filename}")
+
+    if args.csv_dir:
+        print(f"Per-pair gap matrices saved to: {args.csv_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import csv
+import json
+import os
+import sys
+import time
+
+
+# HAR_MODE=record saves the network exchange of a sweep to a HAR file,
+# HAR_MODE=replay serves a sweep entirely from that file with no traffic
+# to the retailer. Unset means a normal live run.
+HAR_MODE = os.environ.get('HAR_MODE', '').lower()
+HAR_DIR = os.environ.get('HAR_DIR', 'har')
+# Free-text name for the strategy under test, written to benchmarks.csv
+HAR_LABEL = os.environ.get('HAR_LABEL', '')
+
+# Other switches that change how a sweep extracts or waits, recorded with
+# each benchmark row so runs on the same HAR can be told apart
+STRATEGY_SWITCHES = ['CALC_MODE', 'REQUEST_FILTER', 'TRACE_SLOW_CELLS',
+                     'BROWSER_SERVER']
+
+BENCHMARK_HEADER = (['Timestamp', 'Script', 'Mode', 'Label'] + STRATEGY_SWITCHES +
+                    ['Combinations', 'Prices found', 'Elapsed (s)', 'Per cell (s)'])
+
+
+def har_path(script_name):
+    return os.environ.get('HAR_PATH') or os.path.join(HAR_DIR, f'{script_name}.har')
+
+
+def setup_har(context, script_name):
+    # Call before any other context.route so later routes (e.g. resource
+    # blocking) still take priority over the HAR router
+    if not HAR_MODE:
+        return None
+    path = har_path(script_name)
+
+    if HAR_MODE == 'record':
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # HAR is written when the context closes
+        context.route_from_har(path, update=True, update_content='embed',
+                               update_mode='full')
+        print(f"Recording network traffic to {path}")
+    elif HAR_MODE == 'replay':
+        if not os.path.exists(path):
+            sys.exit(f"No HAR to replay at {path}; run with HAR_MODE=record first")
+        # Anything not in the recording is aborted so nothing goes live
+        context.route_from_har(path, not_found='abort')
+        print(f"Replaying network traffic from {path}")
+    else:
+        sys.exit(f"Unknown HAR_MODE {HAR_MODE!r}; use 'record' or 'replay'")
+    return path
+
+
+def finish_har(script_name, price_data, total_combinations, elapsed_time):
+    # Record mode keeps the extracted prices next to the HAR as the expected
+    # output; replay mode checks against them so a broken selector or
+    # extraction change shows up before a live run. Both log timings so
+    # extraction and wait strategies can be compared on identical traffic.
+    if not HAR_MODE:
+        return True
+    path = har_path(script_name)
+    expected_path = os.path.splitext(path)[0] + '.prices.json'
+    prices = {f'{w}x{d}': p for (w, d), p in sorted(price_data.items())}
+    found = sum(1 for p in prices.values() if p is not None)
+
+    benchmark_path = os.path.join(HAR_DIR, 'benchmarks.csv')
+    os.makedirs(HAR_DIR, exist_ok=True)
+    if os.path.exists(benchmark_path):
+        with open(benchmark_path, newline='', encoding='utf-8') as csvfile:
+            header = next(csv.reader(csvfile), None)
+        if header != BENCHMARK_HEADER:
+            # Older layout; keep it aside rather than mixing columns
+            old_path = os.path.join(HAR_DIR, f'benchmarks_{int(time.time())}.csv')
+            os.replace(benchmark_path, old_path)
+            print(f"Moved old-format benchmarks to {old_path}")
+    new_file = not os.path.exists(benchmark_path)
+    with open(benchmark_path, 'a', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        if new_file:
+            writer.writerow(BENCHMARK_HEADER)
+        avg_time = elapsed_time / total_combinations if total_combinations else 0
+        writer.writerow([int(time.time()), script_name, HAR_MODE, HAR_LABEL] +
+                        [os.environ.get(name, '') for name in STRATEGY_SWITCHES] +
+                        [total_combinations, found,
+                         f'{elapsed_time:.2f}', f'{avg_time:.3f}'])
+    print(f"Timing appended to {benchmark_path}")
+
+    if HAR_MODE == 'record':
+        with open(expected_path, 'w', encoding='utf-8') as f:
+            json.dump(prices, f, indent=1)
+        print(f"Expected prices saved to {expected_path}")
+        return True
+
+    if not os.path.exists(expected_path):
+        print(f"No expected prices at {expected_path}, skipping comparison")
+        return True
+    with open(expected_path, encoding='utf-8') as f:
+        expected = json.load(f)
+
+    mismatches = [(cell, expected.get(cell), prices.get(cell))
+                  for cell in sorted(set(expected) | set(prices))
+                  if expected.get(cell) != prices.get(cell)]
+    if not mismatches:
+        print(f"Replay matches recording: {found} prices")
+        return True
+    print(f"Replay differs from recording in {len(mismatches)} cells:")
+    for cell, want, got in mismatches[:20]:
+        print(f"  {cell}: expected {want}, got {got}")
+    return False
@@ -0,0 +1,320 @@
+import argparse
+import csv
+import itertools
+import random
+import time
+
+import numpy as np
+from playwright.sync_api import sync_playwright
+
+import browser_server
+import retailers
+import sweep_planner
+
+
+# How close two surcharges must be (in £) to count as the same amount
+TOLERANCE = 0.01
+
+
+def probe_sizes(product):
+    # Corners and middle of the size grid; enough to tell a flat surcharge
+    # from one that scales with size
+    widths, drops = product['widths'], product['drops']
+    return sorted({
+        (widths[0], drops[0]), (widths[-1], drops[0]),
+        (widths[0], drops[-1]), (widths[-1], drops[-1]),
+        (widths[len(widths) // 2], drops[len(drops) // 2]),
+    })
+
+
+def default_options(product):
+    # The form opens on the first value of every option
+    return {label: option['values'][0]
+            for label, option in product.get('options', {}).items()}
+
+
+def apply_options(page, product, combo, current):
+    # Only touch the options that differ from what the form already shows
+    for label, value in combo.items():
+        if current.get(label) != value:
+            retailers.set_option(page, product, label, value)
+            current[label] = value
+
+
+def reload_page(page, product, current):
+    # A reloaded page is back on the default options; put back the ones
+    # being swept
+    wanted = dict(current)
+    retailers.prepare_page(page, product)
+    current.clear()
+    current.update(default_options(product))
+    apply_options(page, product, wanted, current)
+
+
+def sweep_sizes(page, product, sizes, current, prices=None):
+    # Each call starts from a freshly changed option, so set both fields
+    # first. A failed cell reloads the page and is tried once more, as the
+    # price service does; if the options can't be put back this raises.
+    # Cells are added to 'prices' as they're read, so a caller passing its
+    # own dict keeps them if the sweep stops part way.
+    prices = {} if prices is None else prices
+    plan = sweep_planner.plan(sizes, sweep_planner.SITE_COSTS[product['site']])
+    rewrite = False
+    for width, drop, changed in plan:
+        if rewrite:
+            changed = sweep_planner.FIELDS
+            rewrite = False
+        try:
+            price = retailers.get_price(
+                page, product,
+                width if 'width' in changed else None,
+                drop if 'drop' in changed else None)
+        except Exception as e:
+            print(f"  {width}x{drop}: failed ({e}), reloading page...")
+            reload_page(page, product, current)
+            try:
+                price = retailers.get_price(page, product, width, drop)
+            except Exception as e:
+                print(f"  {width}x{drop}: no price ({e})")
+                price = None
+                # Don't trust what the fields show; write both next time
+                rewrite = True
+        prices[(width, drop)] = price
+    return prices
+
+
+def classify(base, probed):
+    # 'none' if the option value never changes the price, 'additive' if it
+    # adds the same amount at every probe size, otherwise 'interacting'
+    deltas = [probed[size] - base[size] for size in base
+              if base[size] is not None and probed.get(size) is not None]
+    if not deltas:
+        return 'interacting', None
+    if all(abs(d) <= TOLERANCE for d in deltas):
+        return 'none', 0.0
+    if max(deltas) - min(deltas) <= TOLERANCE:
+        return 'additive', round(sum(deltas) / len(deltas), 2)
+    return 'interacting', None
+
+
+def screen_options(page, product, current):
+    # Change one option at a time from the defaults at the probe sizes
+    options = product.get('options', {})
+    defaults = default_options(product)
+    probes = probe_sizes(product)
+
+    print(f"Screening {len(options)} options at {len(probes)} probe sizes...")
+    current.update(defaults)
+    base = sweep_sizes(page, product, probes, current)
+
+    effects = {}
+    for label, option in options.items():
+        effects[label] = {option['values'][0]: ('none', 0.0)}
+        for value in option['values'][1:]:
+            try:
+                apply_options(page, product, {label: value}, current)
+                probed = sweep_sizes(page, product, probes, current)
+            except Exception as e:
+                print(f"  {label}={value}: can't screen ({e}), skipping")
+                # The form may be part way there; make sure the default goes back
+                current.pop(label, None)
+                continue
+            effects[label][value] = classify(base, probed)
+            kind, delta = effects[label][value]
+            detail = f" £{delta:+.2f}" if kind == 'additive' else ''
+            print(f"  {label}={value}: {kind}{detail}")
+        apply_options(page, product, {label: defaults[label]}, current)
+
+    check_pairs(page, product, defaults, effects, base, probes, current)
+    return defaults, effects
+
+
+def check_pairs(page, product, defaults, effects, base, probes, current):
+    # The table adds up one-at-a-time surcharges, which only holds if they
+    # don't interact. Probe every pair of additive values from different
+    # options together; a pair that doesn't add up makes both values
+    # interacting, so they get measured grids of their own.
+    additive = [(label, value, delta) for label, values in effects.items()
+                for value, (kind, delta) in values.items() if kind == 'additive']
+    pairs = [(a, b) for a, b in itertools.combinations(additive, 2) if a[0] != b[0]]
+    if pairs:
+        print(f"Checking {len(pairs)} pairs of additive values...")
+
+    for (label_a, value_a, delta_a), (label_b, value_b, delta_b) in pairs:
+        name = f"{label_a}={value_a} + {label_b}={value_b}"
+        expected = {size: None if price is None else price + delta_a + delta_b
+                    for size, price in base.items()}
+        try:
+            apply_options(page, product, {label_a: value_a, label_b: value_b}, current)
+            kind, _ = classify(expected, sweep_sizes(page, product, probes, current))
+        except Exception as e:
+            print(f"  {name}: can't probe ({e})")
+            current.pop(label_a, None)
+            current.pop(label_b, None)
+            kind = 'interacting'
+        if kind == 'none':
+            print(f"  {name}: adds up")
+        else:
+            print(f"  {name}: doesn't add up, treating both as interacting")
+            effects[label_a][value_a] = ('interacting', None)
+            effects[label_b][value_b] = ('interacting', None)
+        apply_options(page, product,
+                      {label_a: defaults[label_a], label_b: defaults[label_b]}, current)
+
+
+def plan_combos(defaults, effects, design, samples, seed):
+    # Only options with an interacting value need their own full grid;
+    # 'none' and 'additive' values are filled in from the default grid
+    interacting = {label: [defaults[label]] + [
+        value for value, (kind, _) in values.items() if kind == 'interacting']
+        for label, values in effects.items()}
+    interacting = {label: values for label, values in interacting.items()
+                   if len(values) > 1}
+
+    labels = list(interacting)
+    combos = [dict(zip(labels, values))
+              for values in itertools.product(*interacting.values())]
+    if design == 'sampled' and len(combos) > samples:
+        # Always keep the all-defaults grid; the rest is a random design
+        rng = random.Random(seed)
+        combos = [combos[0]] + rng.sample(combos[1:], max(samples - 1, 0))
+    return labels, combos
+
+
+def build_table(product, defaults, effects, labels, measured):
+    # Fill a (option1, option2, ..., width, drop) price table for every
+    # declared option value; unsampled interacting combinations stay NaN
+    options = product.get('options', {})
+    axes = [(label, [v for v in option['values'] if v in effects.get(label, {})])
+            for label, option in options.items()]
+    widths, drops = list(product['widths']), list(product['drops'])
+    table = np.full([len(values) for _, values in axes] + [len(widths), len(drops)], np.nan)
+    derived = np.zeros(table.shape[:-2], dtype=bool)
+
+    for index in itertools.product(*[range(len(values)) for _, values in axes]):
+        combo = {label: values[i] for (label, values), i in zip(axes, index)}
+        # The measured grid that shares this combination's interacting values
+        key = tuple(combo[label] if effects[label][combo[label]][0] == 'interacting'
+                    else defaults[label] for label in labels)
+        if key not in measured:
+            continue
+        surcharge = sum(effects[label][value][1] for label, value in combo.items()
+                        if effects[label][value][0] == 'additive')
+        grid = measured[key]
+        for wi, width in enumerate(widths):
+            for di, drop in enumerate(drops):
+                price = grid.get((width, drop))
+                if price is not None:
+                    table[index + (wi, di)] = price + surcharge
+        # Derived unless this exact combination is the one that was swept;
+        # pruned and additive values are filled in from another grid
+        swept = {**defaults, **dict(zip(labels, key))}
+        derived[index] = any(combo[label] != swept[label] for label in combo)
+    return axes, widths, drops, table, derived
+
+
+def save_results(product_name, product, defaults, effects, labels, measured):
+    axes, widths, drops, table, derived = build_table(
+        product, defaults, effects, labels, measured)
+
+    filename = f'{product_name}_option_prices_{int(time.time())}'
+    np.savez_compressed(
+        f'{filename}.npz',
+        prices=table,
+        derived=derived,
+        axis_names=np.array([label for label, _ in axes] + ['Width', 'Drop']),
+        **{f'axis_{i}': np.array(values) for i, (_, values) in enumerate(axes)},
+        widths=np.array(widths),
+        drops=np.array(drops),
+    )
+    print(f"Price table {table.shape} saved to: {filename}.npz")
+
+    # Long-format CSV, one row per priced cell
+    with open(f'{filename}.csv', 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        unit = product['unit']
+        writer.writerow([label for label, _ in axes] +
+                        [f'Width ({unit})', f'Drop ({unit})', 'Price (£)', 'Source'])
+        for index in itertools.product(*[range(len(values)) for _, values in axes]):
+            combo = [values[i] for (_, values), i in zip(axes, index)]
+            source = 'derived' if derived[index] else 'measured'
+            for wi, width in enumerate(widths):
+                for di, drop in enumerate(drops):
+                    price = table[index + (wi, di)]
+                    writer.writerow(combo + [width, drop,
+                                             'N/A' if np.isnan(price) else f'{price:.2f}',
+                                             source])
+    print(f"Detailed prices saved to: {filename}.csv")
+
+    print("\nOption effects:")
+    for label, values in effects.items():
+        for value, (kind, delta) in values.items():
+            detail = f" £{delta:+.2f}" if kind == 'additive' else ''
+            print(f"  {label}={value}: {kind}{detail}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep product options alongside width and drop")
+    parser.add_argument('product', choices=list(retailers.PRODUCTS))
+    parser.add_argument('--design', choices=['cartesian', 'sampled'],
+                        default='cartesian')
+    parser.add_argument('--samples', type=int, default=8,
+                        help="Option combinations to sweep with --design sampled")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--headed', action='store_true')
+    args = parser.parse_args()
+
+    product = retailers.PRODUCTS[args.product]
+    sizes = [(w, d) for w in product['widths'] for d in product['drops']]
+
+    with sync_playwright() as playwright:
+        browser = browser_server.connect(
+            playwright,
+            headless=not args.headed,
+            args=['--disable-dev-shm-usage']
+        )
+        context = browser.new_context(viewport={"width": 1920, "height": 1080})
+        context.route("**/*.{png,jpg,jpeg,gif,svg,woff,woff2}",
+                      lambda route: route.abort())
+        page = context.new_page()
+        retailers.prepare_page(page, product)
+
+        start_time = time.time()
+        current = {}
+        defaults, effects = screen_options(page, product, current)
+        labels, combos = plan_combos(defaults, effects,
+                                     args.design, args.samples, args.seed)
+
+        full_space = int(np.prod([len(v) for v in effects.values()])) if effects else 1
+        print(f"\nProduct space: {full_space} option combinations x {len(sizes)} sizes; "
+              f"sweeping {len(combos)} combinations")
+
+        measured = {}
+        try:
+            restart = False
+            for combo in combos:
+                print(f"Sweeping {combo or 'defaults'}...")
+                try:
+                    if restart:
+                        # The last combination failed part way; start afresh
+                        current.clear()
+                        reload_page(page, product, current)
+                        restart = False
+                    apply_options(page, product, {**defaults, **combo}, current)
+                    grid = measured.setdefault(tuple(combo[label] for label in labels), {})
+                    sweep_sizes(page, product, sizes, current, grid)
+                except Exception as e:
+                    print(f"  Sweep of {combo or 'defaults'} failed ({e}), skipping")
+                    restart = True
+        finally:
+            # Keep whatever was measured if the run is cut short
+            elapsed_time = time.time() - start_time
+            print(f"\nCompleted in {elapsed_time:.2f}s")
+            save_results(args.product, product, defaults, effects, labels, measured)
+        context.close()
+        browser.close()
+
+
+if __name__ == '__main__':
+    main()
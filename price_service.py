@@ -0,0 +1,312 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from playwright.sync_api import sync_playwright
+
+import browser_server
+import retailers
+import sweep_planner
+
+
+class PriceCache:
+    # LRU cache of (product, width, drop) -> price with a time-to-live, so
+    # repeat quotes are instant but prices are re-checked after ttl seconds
+
+    def __init__(self, max_size=4096, ttl=900):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.time() - entry[1] > self.ttl:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, price):
+        with self.lock:
+            self.entries[key] = (price, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+class ProductWorker(threading.Thread):
+    # Owns one warm page for one product. Playwright's sync API is tied to
+    # the thread that started it, so every lookup for this product is queued
+    # here and answered in order - which also serialises use of the page.
+
+    def __init__(self, name, product, cache, headless=True):
+        super().__init__(name=f"worker-{name}", daemon=True)
+        self.product_name = name
+        self.product = product
+        self.cache = cache
+        self.headless = headless
+        self.jobs = queue.Queue()
+        self.ready = threading.Event()
+        self.error = None
+        # (width, drop) currently in the form, unknown until the first lookup
+        self.form_state = (None, None)
+
+    def submit(self, sizes):
+        future = Future()
+        self.jobs.put((sizes, future))
+        return future
+
+    def run(self):
+        try:
+            with sync_playwright() as playwright:
+                self.serve(playwright)
+            return
+        except Exception as e:
+            self.error = str(e)
+            print(f"[{self.product_name}] Browser failed: {e}")
+        finally:
+            # Never leave PriceService waiting on a worker that died
+            self.ready.set()
+
+        # No browser, but keep answering so callers get an error straight
+        # away instead of waiting out their timeout
+        while True:
+            sizes, future = self.jobs.get()
+            if sizes is None:
+                break
+            future.set_exception(RuntimeError(
+                f"{self.product_name} page unavailable: {self.error}"))
+
+    def serve(self, playwright):
+        browser = browser_server.connect(
+            playwright,
+            headless=self.headless,
+            args=['--disable-dev-shm-usage']
+        )
+        context = browser.new_context(
+            viewport={"width": 1920, "height": 1080})
+        context.route("**/*.{png,jpg,jpeg,gif,svg,woff,woff2}",
+                      lambda route: route.abort())
+        page = context.new_page()
+
+        self.warm_up(page)
+        self.ready.set()
+
+        while True:
+            sizes, future = self.jobs.get()
+            if sizes is None:
+                break
+            # A failed warm-up is retried on the next request
+            if self.error and not self.warm_up(page):
+                future.set_exception(RuntimeError(
+                    f"{self.product_name} page unavailable: {self.error}"))
+                continue
+            try:
+                future.set_result(self.lookup(page, sizes))
+            except Exception as e:
+                future.set_exception(e)
+
+        context.close()
+        browser.close()
+
+    def warm_up(self, page):
+        try:
+            retailers.prepare_page(page, self.product)
+        except Exception as e:
+            self.error = str(e)
+            print(f"[{self.product_name}] Failed to warm page: {e}")
+            return False
+        self.error = None
+        self.form_state = (None, None)
+        return True
+
+    def lookup(self, page, sizes):
+        # Visit the sizes in planned order, starting from whatever the form
+        # shows, so each one only rewrites the fields that change
+        prices = {}
+        costs = sweep_planner.SITE_COSTS[self.product['site']]
+        plan = sweep_planner.plan(sizes, costs, start=self.form_state)
+        for width, drop, changed in plan:
+            start_time = time.time()
+            try:
+                # Only returns once the price is for this size, so nothing
+                # left over from the previous quote reaches the cache
+                price = retailers.get_price(
+                    page, self.product,
+                    width if 'width' in changed else None,
+                    drop if 'drop' in changed else None)
+            except Exception as e:
+                # Page may have been disturbed by a popup; warm it up again
+                print(f"[{self.product_name}] {width}x{drop} failed ({e}), reloading page...")
+                self.form_state = (None, None)
+                retailers.prepare_page(page, self.product)
+                price = retailers.get_price(page, self.product, width, drop)
+            self.form_state = (width, drop)
+            prices[(width, drop)] = price
+            # Cache as we go so a batch the caller gave up on still counts
+            if price is not None:
+                self.cache.put((self.product_name, width, drop), price)
+            print(f"[{self.product_name}] {width}x{drop}: {price} "
+                  f"({time.time() - start_time:.2f}s)")
+        return prices
+
+    def stop(self):
+        self.jobs.put((None, None))
+
+
+class PriceService:
+
+    def __init__(self, product_names, cache, headless=True):
+        self.cache = cache
+        self.workers = {}
+        for name in product_names:
+            worker = ProductWorker(name, retailers.PRODUCTS[name], cache, headless)
+            worker.start()
+            self.workers[name] = worker
+        for worker in self.workers.values():
+            worker.ready.wait()
+
+    def quote(self, product_name, sizes, timeout=120, timeout_per_size=3):
+        # Answer from the cache where possible and send the rest to the
+        # product's page in one job. The wait grows with the batch size; a
+        # batch that still times out keeps running and fills the cache.
+        if product_name not in self.workers:
+            raise KeyError(product_name)
+        worker = self.workers[product_name]
+
+        prices = {}
+        missing = []
+        for size in sizes:
+            cached = self.cache.get((product_name, *size))
+            if cached is not None:
+                prices[size] = cached
+            else:
+                missing.append(size)
+
+        if missing:
+            fetched = worker.submit(missing).result(
+                timeout=max(timeout, timeout_per_size * len(missing)))
+            prices.update(fetched)
+        return [{'width': w, 'drop': d, 'price': prices[(w, d)]}
+                for w, d in sizes]
+
+    def stop(self):
+        for worker in self.workers.values():
+            worker.stop()
+
+
+def make_handler(service):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def respond(self, product_name, sizes):
+            try:
+                results = service.quote(product_name, sizes)
+            except KeyError:
+                self.send_json(404, {'error': f"Unknown product: {product_name}"})
+                return
+            except Exception as e:
+                self.send_json(503, {'error': str(e)})
+                return
+            unit = retailers.PRODUCTS[product_name]['unit']
+            self.send_json(200, {'product': product_name, 'unit': unit,
+                                 'prices': results})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            if url.path == '/health':
+                self.send_json(200, {
+                    'products': {name: worker.error or 'ready'
+                                 for name, worker in service.workers.items()},
+                    'cache_entries': len(service.cache.entries),
+                    'cache_hits': service.cache.hits,
+                    'cache_misses': service.cache.misses,
+                })
+            elif url.path == '/products':
+                self.send_json(200, {name: {'url': p['url'], 'unit': p['unit']}
+                                     for name, p in retailers.PRODUCTS.items()
+                                     if name in service.workers})
+            elif url.path == '/price':
+                try:
+                    product_name = params['product'][0]
+                    size = (int(params['width'][0]), int(params['drop'][0]))
+                except (KeyError, ValueError):
+                    self.send_json(400, {'error': "Need product, width and drop"})
+                    return
+                self.respond(product_name, [size])
+            else:
+                self.send_json(404, {'error': f"No route for {url.path}"})
+
+        def do_POST(self):
+            # Body: {"product": "...", "sizes": [[width, drop], ...]}
+            if urlparse(self.path).path != '/batch':
+                self.send_json(404, {'error': f"No route for {self.path}"})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length))
+                product_name = body['product']
+                sizes = [(int(w), int(d)) for w, d in body['sizes']]
+            except (KeyError, ValueError, TypeError):
+                self.send_json(400, {'error': "Need product and sizes"})
+                return
+            self.respond(product_name, sizes)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve one-off price quotes from warm product pages")
+    parser.add_argument('--products', nargs='+',
+                        default=list(retailers.PRODUCTS),
+                        choices=list(retailers.PRODUCTS),
+                        help="Products to keep warm (default: all)")
+    parser.add_argument('--port', type=int, default=8247)
+    parser.add_argument('--cache-size', type=int, default=4096)
+    parser.add_argument('--ttl', type=int, default=900,
+                        help="Seconds before a cached price is re-checked")
+    parser.add_argument('--headed', action='store_true')
+    args = parser.parse_args()
+
+    print("Warming product pages...")
+    cache = PriceCache(args.cache_size, args.ttl)
+    service = PriceService(args.products, cache, headless=not args.headed)
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(service))
+    print(f"Serving prices on http://127.0.0.1:{args.port}")
+    print("  GET  /price?product=<name>&width=<w>&drop=<d>")
+    print("  POST /batch  {\"product\": \"<name>\", \"sizes\": [[w, d], ...]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+from collections import Counter
+from urllib.parse import urlparse
+
+
+# REQUEST_FILTER=allowlist puts an allowlist in front of the scripts'
+# image/font blocking: only the listed hosts may load, and only the listed
+# resource types. Analytics, chat widgets and ad tags never get to run.
+REQUEST_FILTER = os.environ.get('REQUEST_FILTER', '').lower()
+ALLOWLIST_DIR = os.environ.get('ALLOWLIST_DIR', 'allowlists')
+
+# First-party traffic the price forms need. Subdomains of a host are
+# allowed too, so 'blindsbypost.co.uk' also covers 'www.' and CDN hosts.
+ALLOWLISTS = {
+    '247blinds': {
+        'hosts': ['247blinds.co.uk'],
+        'resource_types': ['document', 'script', 'xhr', 'fetch'],
+    },
+    'blindsbypost': {
+        'hosts': ['blindsbypost.co.uk'],
+        'resource_types': ['document', 'script', 'xhr', 'fetch'],
+    },
+}
+
+# Hosts never worth learning even when they serve scripts: analytics, ads,
+# chat widgets and the attentive SMS signup
+THIRD_PARTY_NOISE = [
+    'google-analytics', 'googletagmanager', 'doubleclick', 'googlesyndication',
+    'googleadservices', 'facebook', 'fbcdn', 'attentive', 'attn.tv', 'hotjar',
+    'clarity.ms', 'bing.com', 'tiktok', 'pinterest', 'snapchat', 'criteo',
+    'klaviyo', 'zendesk', 'livechat', 'tawk.to', 'intercom', 'trustpilot',
+    'feefo', 'reviews.co.uk', 'cookiebot', 'onetrust', 'youtube', 'vimeo',
+]
+
+
+def load_allowlist(site):
+    # A learned allowlist on disk takes precedence over the built-in one
+    path = os.path.join(ALLOWLIST_DIR, f'{site}.json')
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            print(f"Using learned allowlist {path}")
+            return json.load(f)
+    return ALLOWLISTS[site]
+
+
+def host_allowed(host, hosts):
+    return any(host == h or host.endswith('.' + h) for h in hosts)
+
+
+def is_allowed(allowlist, url, resource_type):
+    host = urlparse(url).hostname or ''
+    return (resource_type in allowlist['resource_types']
+            and host_allowed(host, allowlist['hosts']))
+
+
+class RequestFilter:
+
+    def __init__(self, allowlist):
+        self.allowlist = allowlist
+        self.allowed = Counter()
+        self.blocked = Counter()
+        self.blocked_hosts = Counter()
+
+    def handle(self, route):
+        request = route.request
+        if is_allowed(self.allowlist, request.url, request.resource_type):
+            self.allowed[request.resource_type] += 1
+            # Let earlier routes (e.g. HAR replay) serve it
+            route.fallback()
+        else:
+            self.blocked[request.resource_type] += 1
+            self.blocked_hosts[urlparse(request.url).hostname or ''] += 1
+            route.abort()
+
+    def report(self):
+        total_allowed = sum(self.allowed.values())
+        total_blocked = sum(self.blocked.values())
+        print(f"\nRequest filter: {total_allowed} allowed, "
+              f"{total_blocked} blocked")
+        for resource_type, count in self.blocked.most_common():
+            print(f"  blocked {count} {resource_type}")
+        for host, count in self.blocked_hosts.most_common(10):
+            print(f"  blocked {count} from {host}")
+
+
+def install(context, site):
+    # Call after any other context.route so this runs first
+    if REQUEST_FILTER != 'allowlist':
+        return None
+    request_filter = RequestFilter(load_allowlist(site))
+    context.route("**/*", request_filter.handle)
+    print(f"Allowlist request filter on for {site}")
+    return request_filter
+
+
+def har_entries(har_path):
+    # Yield (url, host, resource_type, bytes) for every entry in a HAR
+    with open(har_path, encoding='utf-8') as f:
+        entries = json.load(f)['log']['entries']
+    for entry in entries:
+        url = entry['request']['url']
+        headers = {h['name'].lower(): h['value']
+                   for h in entry['request'].get('headers', [])}
+        mime_type = entry['response'].get('content', {}).get('mimeType', '')
+        resource_type = entry.get('_resourceType') or guess_resource_type(
+            headers.get('sec-fetch-dest', ''), mime_type)
+        response = entry['response']
+        size = response.get('_transferSize', -1)
+        if size is None or size < 0:
+            size = max(response.get('bodySize', 0), 0) + max(response.get('headersSize', 0), 0)
+        if size <= 0:
+            size = response.get('content', {}).get('size', 0)
+        yield url, urlparse(url).hostname or '', resource_type, size
+
+
+def guess_resource_type(fetch_dest, mime_type):
+    # HARs don't always carry the resource type; rebuild it from the
+    # Sec-Fetch-Dest header, or the response mime type when that's missing
+    dest_types = {
+        'document': 'document', 'iframe': 'document', 'script': 'script',
+        'style': 'stylesheet', 'image': 'image', 'font': 'font',
+        'empty': 'xhr', 'video': 'media', 'audio': 'media',
+    }
+    if fetch_dest in dest_types:
+        return dest_types[fetch_dest]
+    if 'html' in mime_type:
+        return 'document'
+    if 'javascript' in mime_type or 'ecmascript' in mime_type:
+        return 'script'
+    if 'json' in mime_type or 'xml' in mime_type:
+        return 'xhr'
+    if 'css' in mime_type:
+        return 'stylesheet'
+    if mime_type.startswith('image/'):
+        return 'image'
+    if 'font' in mime_type:
+        return 'font'
+    return 'other'
+
+
+def learn(har_path, site):
+    # Build an allowlist from a recorded run: every host that served a
+    # document, script or XHR, minus known third-party noise
+    base = ALLOWLISTS[site]
+    hosts = set(base['hosts'])
+    for url, host, resource_type, size in har_entries(har_path):
+        if resource_type not in base['resource_types'] or not host:
+            continue
+        if any(noise in host for noise in THIRD_PARTY_NOISE):
+            continue
+        if not host_allowed(host, hosts):
+            hosts.add(host)
+    return {'hosts': sorted(hosts), 'resource_types': base['resource_types']}
+
+
+def savings(har_path, allowlist):
+    # Requests and bytes in a recorded run the allowlist would have stopped
+    kept = Counter()
+    saved = Counter()
+    for url, host, resource_type, size in har_entries(har_path):
+        bucket = kept if is_allowed(allowlist, url, resource_type) else saved
+        bucket['requests'] += 1
+        bucket['bytes'] += size
+        bucket[resource_type] += 1
+    return kept, saved
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Learn allowlists from recorded HARs and report savings")
+    parser.add_argument('action', choices=['learn', 'report'])
+    parser.add_argument('har', help="HAR from a HAR_MODE=record run")
+    parser.add_argument('--site', required=True, choices=list(ALLOWLISTS))
+    args = parser.parse_args()
+
+    if args.action == 'learn':
+        allowlist = learn(args.har, args.site)
+        os.makedirs(ALLOWLIST_DIR, exist_ok=True)
+        path = os.path.join(ALLOWLIST_DIR, f'{args.site}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(allowlist, f, indent=2)
+        print(f"Learned {len(allowlist['hosts'])} hosts, saved to {path}:")
+        for host in allowlist['hosts']:
+            print(f"  {host}")
+    else:
+        allowlist = load_allowlist(args.site)
+
+    kept, saved = savings(args.har, allowlist)
+    total_requests = kept['requests'] + saved['requests']
+    total_bytes = kept['bytes'] + saved['bytes']
+    print(f"\nRecorded run: {total_requests} requests, {total_bytes / 1024:.0f} KiB")
+    print(f"Allowlist keeps {kept['requests']} requests ({kept['bytes'] / 1024:.0f} KiB)")
+    print(f"Allowlist saves {saved['requests']} requests ({saved['bytes'] / 1024:.0f} KiB)")
+    for resource_type, count in saved.most_common():
+        if resource_type not in ('requests', 'bytes'):
+            print(f"  {count} {resource_type}")
+
+
+if __name__ == '__main__':
+    main()
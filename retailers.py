@@ -0,0 +1,263 @@
+import re
+import time
+from urllib.parse import urlparse
+
+
+# Products the shared tools know how to drive. Sizes are always in the
+# unit the retailer's form takes ('cm' for 247blinds, 'mm' for Blinds By Post).
+# 'options' lists the other price-form choices, keyed by the label shown on
+# the page; 'select' options are <select>s, 'click' options are swatches or
+# buttons picked by their visible text. The first value is the page default.
+PRODUCTS = {
+    '247-andromeda-vertical': {
+        'site': '247blinds',
+        'url': 'https://www.247blinds.co.uk/andromeda-breeze-white-vertical-blind',
+        'unit': 'cm',
+        'widths': range(41, 211, 10),
+        'drops': range(41, 181, 10),
+    },
+    '247-sierra-shutter': {
+        'site': '247blinds',
+        'url': 'https://www.247blinds.co.uk/sierra-ice-white-perfect-fit-shutter-blind',
+        'unit': 'cm',
+        'widths': range(30, 301, 10),
+        'drops': range(30, 211, 10),
+        'options': {
+            'Louvre Size': {'kind': 'click', 'values': ['64mm', '89mm']},
+            'Frame': {'kind': 'click', 'values': ['L Frame', 'Z Frame']},
+            'Colour': {'kind': 'click', 'values': ['Ice White', 'Pure White']},
+        },
+    },
+    'bbp-cotton-white-shutter': {
+        'site': 'blindsbypost',
+        'url': 'https://www.blindsbypost.co.uk/perfect-fit-blinds/perfect-fit-shutters/cotton-white-perfect-fit-shutter/',
+        'unit': 'mm',
+        'widths': range(201, 1801, 100),
+        'drops': range(229, 2401, 100),
+        'width_placeholder': '- 1800 mm',
+        'drop_placeholder': '- 2400 mm',
+        # The 4th £ amount on the page is the product price
+        'price_index': 3,
+        # The shutter scripts wait 400ms, then 600ms more for a slow redraw
+        'settle_ms': 1000,
+        'options': {
+            'Louvre Size': {'kind': 'select', 'values': ['47mm', '63mm', '89mm']},
+            'Frame Type': {'kind': 'select', 'values': ['Standard', 'Deep']},
+        },
+    },
+    'bbp-tradechoice-roller': {
+        'site': 'blindsbypost',
+        'url': 'https://www.blindsbypost.co.uk/roller-blinds/tradechoice-brilliant-white-roller-blinds/',
+        'unit': 'mm',
+        'widths': range(250, 2501, 100),
+        'drops': range(250, 3001, 100),
+        'width_placeholder': '250 - 2500 mm',
+        'drop_placeholder': '250 - 3008 mm',
+        'price_selector': '.cus-discount-price',
+        # The roller widget needs 0.8s after the last field change
+        'settle_ms': 800,
+        'options': {
+            'Control Side': {'kind': 'select', 'values': ['Right', 'Left']},
+            'Fitting': {'kind': 'select', 'values': ['Top Fix', 'Face Fix']},
+        },
+    },
+}
+
+PRICE_PATTERN = re.compile(r'£(\d+\.\d+)')
+
+
+def dismiss_popups(page, product):
+    if product['site'] == '247blinds':
+        # Handle cookie consent
+        try:
+            page.get_by_role("button", name="Allow Selected").click(timeout=3000)
+            print("Clicked cookie consent")
+        except Exception:
+            print("No cookie popup found")
+
+        # Handle signup popup, falling back to removing the overlay
+        try:
+            page.locator("iframe[title=\"Sign Up via Text for Offers\"]").content_frame.get_by_test_id(
+                "dismissbutton2").click(timeout=3000)
+            print("Dismissed signup popup")
+        except Exception:
+            page.evaluate("""() => {
+                const overlay = document.getElementById('attentive_overlay');
+                if (overlay) overlay.remove();
+            }""")
+            print("Removed attentive overlay via JavaScript")
+    else:
+        # Cookie dialog on shutter pages, newsletter popup on roller pages
+        try:
+            page.get_by_role("button", name="Close dialog").click(timeout=3000)
+            print("Closed cookie dialog")
+        except Exception:
+            print("No cookie dialog found")
+        try:
+            page.get_by_role("button", name="No, thanks").click(timeout=3000)
+            print("Dismissed newsletter popup")
+        except Exception:
+            print("No newsletter popup found")
+
+
+def width_input(page, product):
+    if product['site'] == '247blinds':
+        return page.locator("#input-custom-Width")
+    return page.get_by_placeholder(product['width_placeholder'])
+
+
+def drop_input(page, product):
+    if product['site'] == '247blinds':
+        return page.locator("#input-custom-Drop")
+    return page.get_by_placeholder(product['drop_placeholder'])
+
+
+def prepare_page(page, product):
+    # Load the product page, clear popups and leave the size form ready
+    print(f"Loading {product['url']}...")
+    page.goto(product['url'], wait_until="domcontentloaded")
+    dismiss_popups(page, product)
+
+    print("Waiting for form...")
+    width_input(page, product).wait_for(state="visible", timeout=15000)
+    drop_input(page, product).wait_for(state="visible", timeout=15000)
+
+    if product['site'] == 'blindsbypost':
+        # The price widget only appears after the first GET INSTANT PRICE
+        set_dimensions(page, product, product['widths'][0], product['drops'][0])
+        page.get_by_text("GET INSTANT PRICE").first.click()
+        page.wait_for_timeout(2000)
+
+
+def set_dimensions(page, product, width=None, drop=None):
+    # Only touch the fields that are given, so callers can skip unchanged ones
+    for field, value in ((width_input(page, product), width),
+                         (drop_input(page, product), drop)):
+        if value is None:
+            continue
+        field.click(force=True)
+        field.press("Control+a")
+        field.fill(str(value))
+
+
+def price_text(page, product):
+    # The price text the page shows right now, '' before the first quote
+    if product['site'] == '247blinds':
+        price_element = page.locator("#level2-area .price").first
+        if price_element.count():
+            return price_element.text_content() or ''
+        area = page.locator("#level2-area").first
+        return (area.text_content() or '') if area.count() else ''
+    if 'price_selector' in product:
+        element = page.locator(product['price_selector']).first
+        return (element.text_content() or '') if element.count() else ''
+    elements = page.locator("text=/£[0-9]+\\.[0-9]+/").all()
+    if len(elements) <= product['price_index']:
+        return ''
+    return elements[product['price_index']].text_content() or ''
+
+
+def read_price(page, product, before, timeout=3000):
+    # Trigger a recalculation for whatever is in the form and return the
+    # price once it is known to be for these sizes. 'before' is the
+    # price_text() from before the fields changed. Neighbouring sizes in the
+    # same band show the same price, so an unchanged price only counts once
+    # 247's pricing request has answered, or once the Blinds By Post
+    # calculator has had its full settle time.
+    answered = []
+    if product['site'] == '247blinds':
+        host = urlparse(product['url']).hostname
+
+        def on_response(response):
+            if (response.request.resource_type in ('xhr', 'fetch')
+                    and urlparse(response.url).hostname == host):
+                answered.append(time.time())
+
+        page.on("response", on_response)
+        settle_at = None
+    else:
+        settle_at = time.time() + product['settle_ms'] / 1000
+
+    try:
+        if product['site'] == '247blinds':
+            page.get_by_role("button", name="Get Price").click(force=True)
+        else:
+            # Tab out of the field so the options form recalculates
+            page.keyboard.press("Tab")
+
+        deadline = time.time() + timeout / 1000
+        text = last = price_text(page, product)
+        last_change = time.time()
+        while True:
+            now = time.time()
+            # A new price has to hold briefly, in case the form redraws
+            # once per field
+            fresh = text != before and now - last_change >= 0.15
+            # Give the page a moment to draw the answer it got
+            replied = answered and now - answered[-1] >= 0.3
+            settled = settle_at is not None and now >= settle_at
+            if fresh or replied or settled:
+                break
+            if now > deadline:
+                raise TimeoutError(f"Price didn't update within {timeout}ms")
+            page.wait_for_timeout(50)
+            text = price_text(page, product)
+            if text != last:
+                last, last_change = text, time.time()
+    finally:
+        if product['site'] == '247blinds':
+            page.remove_listener("response", on_response)
+
+    match = PRICE_PATTERN.search(text or '')
+    return float(match.group(1)) if match else None
+
+
+# True if a clicked swatch or button now shows as the chosen one: checked
+# through aria, a selected/active/checked class, or a radio it labels
+OPTION_SELECTED_JS = """
+(el) => {
+    for (let node = el, depth = 0; node && node !== document.body && depth < 4;
+         node = node.parentElement, depth++) {
+        for (const attr of ['aria-checked', 'aria-pressed', 'aria-selected']) {
+            if (node.getAttribute(attr) === 'true') return true;
+        }
+        if (/(^|[-_ ])(selected|active|checked)($|[-_ ])/i.test(node.getAttribute('class') || '')) return true;
+        const input = node.matches('input') ? node
+            : node.control || node.querySelector('input[type=radio], input[type=checkbox]');
+        if (input && input.checked) return true;
+    }
+    return false;
+}
+"""
+
+
+def set_option(page, product, label, value):
+    # Raise unless the option really ends up on this value, so a wrong label
+    # or value is skipped rather than screened as having no price effect
+    option = product['options'][label]
+    if option['kind'] == 'select':
+        select = page.get_by_label(label).first
+        select.select_option(label=value, timeout=5000)
+        selected = select.evaluate("(el) => el.options[el.selectedIndex].text.trim()")
+        if selected != value:
+            raise RuntimeError(f"{label} shows {selected!r} after choosing {value!r}")
+    else:
+        # The same text can appear in descriptions; try each visible match
+        # until one of them takes
+        for candidate in page.get_by_text(value, exact=True).all()[:5]:
+            if not candidate.is_visible():
+                continue
+            candidate.click(force=True, timeout=5000)
+            if candidate.evaluate(OPTION_SELECTED_JS):
+                break
+        else:
+            raise RuntimeError(f"No {label} choice for {value!r} shows as selected")
+    # Options forms recalculate on change; let them settle before sizing
+    page.wait_for_timeout(300)
+
+
+def get_price(page, product, width=None, drop=None):
+    # Set whichever fields are given and return the price they produce
+    before = price_text(page, product)
+    set_dimensions(page, product, width, drop)
+    return read_price(page, product, before)
@@ -0,0 +1,100 @@
+import json
+import os
+import time
+
+
+# TRACE_SLOW_CELLS=<percentile> (e.g. 95) keeps a rolling trace window open
+# during a sweep and only saves it for cells slower than that percentile
+TRACE_SLOW_CELLS = os.environ.get('TRACE_SLOW_CELLS')
+
+
+class SlowCellTracer:
+    # Each cell runs inside its own Playwright tracing chunk and CDP CPU
+    # profile. Chunks for ordinary cells are thrown away; a cell whose
+    # latency is over the running percentile gets its network trace and JS
+    # CPU profile written out. Screenshots and DOM snapshots stay off to
+    # keep the always-on cost low.
+
+    def __init__(self, context, page, percentile=95, warmup=10,
+                 max_traces=10, min_seconds=1.0, out_dir='traces'):
+        self.context = context
+        self.page = page
+        self.percentile = percentile
+        self.warmup = warmup
+        self.max_traces = max_traces
+        self.min_seconds = min_seconds
+        self.out_dir = out_dir
+        self.latencies = []
+        self.saved = []
+        self.label = None
+        self.start_time = None
+
+        os.makedirs(out_dir, exist_ok=True)
+        context.tracing.start(screenshots=False, snapshots=False, sources=False)
+        self.cdp = context.new_cdp_session(page)
+        self.cdp.send("Profiler.enable")
+        print(f"Tracing cells slower than p{percentile:g} into {out_dir}/")
+
+    def threshold(self):
+        # Nearest-rank percentile of the cells seen so far
+        if len(self.latencies) < self.warmup:
+            return None
+        ordered = sorted(self.latencies)
+        rank = max(0, int(round(self.percentile / 100 * len(ordered))) - 1)
+        return max(ordered[rank], self.min_seconds)
+
+    def start_cell(self, label):
+        self.label = label
+        self.context.tracing.start_chunk(title=label)
+        self.cdp.send("Profiler.start")
+        self.start_time = time.time()
+
+    def end_cell(self):
+        elapsed = time.time() - self.start_time
+        profile = self.cdp.send("Profiler.stop")['profile']
+        limit = self.threshold()
+        self.latencies.append(elapsed)
+
+        if limit is not None and elapsed > limit and len(self.saved) < self.max_traces:
+            name = f"{self.label}_{elapsed:.2f}s"
+            trace_path = os.path.join(self.out_dir, f"{name}.zip")
+            profile_path = os.path.join(self.out_dir, f"{name}.cpuprofile")
+            self.context.tracing.stop_chunk(path=trace_path)
+            with open(profile_path, 'w', encoding='utf-8') as f:
+                json.dump(profile, f)
+            self.saved.append((self.label, elapsed, limit, trace_path))
+            print(f"  Slow cell {self.label}: {elapsed:.2f}s "
+                  f"(p{self.percentile:g} {limit:.2f}s), trace saved to {trace_path}")
+        else:
+            self.context.tracing.stop_chunk()
+
+    def close(self):
+        self.context.tracing.stop()
+        self.cdp.detach()
+        if self.saved:
+            print(f"\nSaved {len(self.saved)} slow-cell traces "
+                  f"(view with: playwright show-trace <file>):")
+            for label, elapsed, limit, trace_path in self.saved:
+                print(f"  {label}: {elapsed:.2f}s > {limit:.2f}s -> {trace_path}")
+        else:
+            print("\nNo slow-cell traces saved")
+
+
+class NoTracer:
+    # Stand-in used when TRACE_SLOW_CELLS isn't set
+
+    def start_cell(self, label):
+        pass
+
+    def end_cell(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def make_tracer(context, page, script_name):
+    if not TRACE_SLOW_CELLS:
+        return NoTracer()
+    return SlowCellTracer(context, page, percentile=float(TRACE_SLOW_CELLS),
+                          out_dir=os.path.join('traces', script_name))
@@ -0,0 +1,89 @@
+# Plans the order a sweep visits its cells in, so each step only rewrites
+# the form fields that actually change.
+#
+# Cells are grouped by one axis (the "outer" field) and walked serpentine
+# along the other: 41x41, 41x51 ... 41x171, 51x171, 51x161 ... so moving to
+# the next group leaves the inner field where it is and only the outer field
+# is rewritten.
+#
+# Width is the outer axis. No measurement has shown either field to be
+# slower to rewrite, so both cost the same below, and on a full grid the two
+# axis choices need exactly the same number of writes. The costing only
+# changes the order for partial sets (price service batches, probe sizes)
+# where grouping on the axis with fewer distinct values saves writes.
+
+# Rough per-site costs in seconds. 'width'/'drop' are clearing and typing
+# into the field; 'recalc' is getting the price widget to recompute. The
+# 247 form recalculates once per Get Price click; the Blinds By Post
+# options form recalculates on every field change. Set 'width' and 'drop'
+# apart only from measured per-field times.
+SITE_COSTS = {
+    '247blinds': {'width': 0.15, 'drop': 0.15, 'recalc': 0.5,
+                  'recalc_per_field': False},
+    'blindsbypost': {'width': 0.2, 'drop': 0.2, 'recalc': 0.4,
+                     'recalc_per_field': True},
+}
+
+FIELDS = ('width', 'drop')
+
+
+def grid(widths, drops):
+    return [(w, d) for w in widths for d in drops]
+
+
+def serpentine(cells, outer):
+    # Order cells by the outer field, reversing the inner direction on
+    # every other group
+    inner = 1 - outer
+    groups = {}
+    for cell in cells:
+        groups.setdefault(cell[outer], []).append(cell)
+    ordered = []
+    for i, key in enumerate(sorted(groups)):
+        group = sorted(groups[key], key=lambda cell: cell[inner], reverse=i % 2 == 1)
+        ordered.extend(group)
+    return ordered
+
+
+def steps_for(order, start=(None, None)):
+    # Pair each cell with the fields that differ from the previous cell
+    steps = []
+    previous = start
+    for cell in order:
+        changed = tuple(field for i, field in enumerate(FIELDS)
+                        if cell[i] != previous[i])
+        steps.append((cell[0], cell[1], changed))
+        previous = cell
+    return steps
+
+
+def cost(steps, costs):
+    total = 0.0
+    for _, _, changed in steps:
+        total += sum(costs[field] for field in changed)
+        if costs['recalc_per_field']:
+            total += costs['recalc'] * len(changed)
+        else:
+            total += costs['recalc']
+    return total
+
+
+def plan(cells, costs, start=(None, None)):
+    # Return [(width, drop, changed_fields), ...] for the cheapest traversal,
+    # keeping width outer on a tie. 'start' is what the form already shows,
+    # so a cell matching it on one field only needs the other one typed.
+    cells = list(dict.fromkeys(cells))
+    width_outer = steps_for(serpentine(cells, 0), start)
+    drop_outer = steps_for(serpentine(cells, 1), start)
+    # Rounded so float noise in equal totals doesn't decide the tie
+    if round(cost(drop_outer, costs), 6) < round(cost(width_outer, costs), 6):
+        return drop_outer
+    return width_outer
+
+
+def describe(steps, costs):
+    # One-line summary of how many field writes a plan needs
+    writes = sum(len(changed) for _, _, changed in steps)
+    naive = 2 * len(steps)
+    return (f"{len(steps)} cells, {writes} field updates "
+            f"(vs {naive} rewriting both), estimated {cost(steps, costs):.1f}s")